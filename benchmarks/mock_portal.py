@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the xdg-desktop-portal ScreenCast interface
+
+Owns org.freedesktop.portal.Desktop on the session bus and answers
+CreateSession, SelectSources, Start and OpenPipeWireRemote without a
+compositor. Run it on a private bus (dbus-run-session); run_benchmarks.py
+does that for you. The PipeWire fd handed out is /dev/null; the harness
+replaces the pipewiresrc element with videotestsrc.
+"""
+
+import argparse
+import os
+import sys
+
+import gi
+gi.require_version('Gio', '2.0')
+from gi.repository import GLib, Gio
+
+
+BUS_NAME = 'org.freedesktop.portal.Desktop'
+OBJECT_PATH = '/org/freedesktop/portal/desktop'
+
+INTROSPECTION = '''
+<node>
+  <interface name="org.freedesktop.portal.ScreenCast">
+    <method name="CreateSession">
+      <arg type="a{sv}" name="options" direction="in"/>
+      <arg type="o" name="handle" direction="out"/>
+    </method>
+    <method name="SelectSources">
+      <arg type="o" name="session_handle" direction="in"/>
+      <arg type="a{sv}" name="options" direction="in"/>
+      <arg type="o" name="handle" direction="out"/>
+    </method>
+    <method name="Start">
+      <arg type="o" name="session_handle" direction="in"/>
+      <arg type="s" name="parent_window" direction="in"/>
+      <arg type="a{sv}" name="options" direction="in"/>
+      <arg type="o" name="handle" direction="out"/>
+    </method>
+    <method name="OpenPipeWireRemote">
+      <arg type="o" name="session_handle" direction="in"/>
+      <arg type="a{sv}" name="options" direction="in"/>
+      <arg type="h" name="fd" direction="out"/>
+    </method>
+    <property name="AvailableSourceTypes" type="u" access="read"/>
+    <property name="AvailableCursorModes" type="u" access="read"/>
+    <property name="version" type="u" access="read"/>
+  </interface>
+  <interface name="org.freedesktop.portal.Session">
+    <method name="Close"/>
+    <signal name="Closed">
+      <arg type="a{sv}" name="details"/>
+    </signal>
+  </interface>
+</node>
+'''
+
+
+def parse_size(text):
+    """Parse "WIDTHxHEIGHT" """
+    width, height = (int(value) for value in text.lower().split('x'))
+    return width, height
+
+
+class MockScreenCastPortal:
+    """Answers ScreenCast calls with a fixed set of monitor streams"""
+    
+    VERSION = 4
+    # Node IDs handed out for the streams, in order
+    FIRST_NODE_ID = 100
+    
+    def __init__(self, sizes, delay_ms=0):
+        self.sizes = sizes
+        self.delay_ms = delay_ms
+        self.node_info = Gio.DBusNodeInfo.new_for_xml(INTROSPECTION)
+        self.connection = None
+        self.sessions = {}
+        self.session_counter = 0
+    
+    def get_streams(self):
+        """Portal 'streams' value: monitors laid out left to right"""
+        streams = []
+        x = 0
+        for index, (width, height) in enumerate(self.sizes):
+            streams.append((self.FIRST_NODE_ID + index, {
+                'position': GLib.Variant('(ii)', (x, 0)),
+                'size': GLib.Variant('(ii)', (width, height)),
+                'source_type': GLib.Variant('u', 1),
+            }))
+            x += width
+        return streams
+    
+    def on_bus_acquired(self, connection, name):
+        self.connection = connection
+        connection.register_object(
+            OBJECT_PATH,
+            self.node_info.lookup_interface('org.freedesktop.portal.ScreenCast'),
+            self.on_method_call,
+            self.on_get_property,
+            None)
+    
+    @staticmethod
+    def request_path(sender, options):
+        """Request object path as the portal spec derives it"""
+        token = options.get('handle_token', 'request')
+        sender_token = sender[1:].replace('.', '_')
+        return f'{OBJECT_PATH}/request/{sender_token}/{token}'
+    
+    def respond(self, sender, request_path, results):
+        """Emit Request.Response (after the reply, like the real portal)"""
+        def emit():
+            self.connection.emit_signal(
+                sender, request_path, 'org.freedesktop.portal.Request', 'Response',
+                GLib.Variant('(ua{sv})', (0, results)))
+            return False
+        GLib.timeout_add(self.delay_ms, emit)
+    
+    def on_method_call(self, connection, sender, path, interface, method, params, invocation):
+        if interface == 'org.freedesktop.portal.Session':
+            self.close_session(path)
+            invocation.return_value(None)
+            return
+        
+        if method == 'CreateSession':
+            options = params.unpack()[0]
+            self.session_counter += 1
+            token = options.get('session_handle_token', f'session{self.session_counter}')
+            session_path = f'{OBJECT_PATH}/session/{sender[1:].replace(".", "_")}/{token}'
+            self.sessions[session_path] = connection.register_object(
+                session_path,
+                self.node_info.lookup_interface('org.freedesktop.portal.Session'),
+                self.on_method_call, None, None)
+            request_path = self.request_path(sender, options)
+            invocation.return_value(GLib.Variant('(o)', (request_path,)))
+            self.respond(sender, request_path,
+                         {'session_handle': GLib.Variant('s', session_path)})
+        
+        elif method == 'SelectSources':
+            session_path, options = params.unpack()
+            request_path = self.request_path(sender, options)
+            invocation.return_value(GLib.Variant('(o)', (request_path,)))
+            self.respond(sender, request_path, {})
+        
+        elif method == 'Start':
+            session_path, parent_window, options = params.unpack()
+            request_path = self.request_path(sender, options)
+            invocation.return_value(GLib.Variant('(o)', (request_path,)))
+            self.respond(sender, request_path, {
+                'streams': GLib.Variant('a(ua{sv})', self.get_streams()),
+                'restore_token': GLib.Variant('s', 'mock-restore-token'),
+            })
+        
+        elif method == 'OpenPipeWireRemote':
+            fd_list = Gio.UnixFDList()
+            fd = os.open(os.devnull, os.O_RDWR)
+            index = fd_list.append(fd)
+            os.close(fd)
+            invocation.return_value_with_unix_fd_list(GLib.Variant('(h)', (index,)), fd_list)
+        
+        else:
+            invocation.return_dbus_error('org.freedesktop.DBus.Error.UnknownMethod', method)
+    
+    def on_get_property(self, connection, sender, path, interface, name):
+        if name == 'AvailableSourceTypes':
+            return GLib.Variant('u', 1 | 2)
+        if name == 'AvailableCursorModes':
+            return GLib.Variant('u', 1 | 2)
+        if name == 'version':
+            return GLib.Variant('u', self.VERSION)
+        return None
+    
+    def close_session(self, session_path):
+        registration = self.sessions.pop(session_path, None)
+        if registration:
+            self.connection.unregister_object(registration)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--stream', action='append', type=parse_size, metavar='WxH',
+                        help='monitor stream to offer (repeatable, default 1920x1080)')
+    parser.add_argument('--delay-ms', type=int, default=0,
+                        help='delay before each Request.Response, to mimic a compositor')
+    args = parser.parse_args()
+    
+    portal = MockScreenCastPortal(args.stream or [(1920, 1080)], args.delay_ms)
+    loop = GLib.MainLoop()
+    
+    def on_name_acquired(connection, name):
+        # The harness waits for this line before starting a scenario
+        print('ready', flush=True)
+    
+    def on_name_lost(connection, name):
+        print(f'Could not own {BUS_NAME}; is a real portal running on this bus?',
+              file=sys.stderr)
+        loop.quit()
+    
+    Gio.bus_own_name(Gio.BusType.SESSION, BUS_NAME, Gio.BusNameOwnerFlags.NONE,
+                     portal.on_bus_acquired, on_name_acquired, on_name_lost)
+    loop.run()
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
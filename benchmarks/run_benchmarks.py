@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+"""
+Reproducible SimpleShot capture benchmarks
+
+Runs the real ScreenCastSession, FrameGrabber, ScreenshotSaveQueue and
+recording pipelines against mock_portal.py on a private session bus, with
+videotestsrc standing in for the PipeWire streams. No desktop is needed.
+
+Scenarios:
+    latency     session start, first frame and grab latency at 1080p/4K/8K
+    burst       CaptureSequence throughput (capture + crop + encode + write)
+    crop_save   crop, encode and write time per image format
+    recording   encoded fps, dropped frames and CPU per encoder backend
+
+Usage:
+    python3 benchmarks/run_benchmarks.py [--quick] [--scenario NAME ...]
+                                         [--output FILE] [--compare BASELINE]
+
+Results are written as JSON; keep one as a baseline and pass it to
+--compare on later runs to see what changed.
+"""
+
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+REPO_DIR = BENCHMARK_DIR.parent
+SCHEMA_VERSION = 1
+
+# Set once we are running inside dbus-run-session
+BUS_ENV_VAR = 'SIMPLESHOT_BENCH_BUS'
+
+RESOLUTIONS = {
+    '1080p': (1920, 1080),
+    '4k': (3840, 2160),
+    '8k': (7680, 4320),
+}
+FRAMERATE = 60
+
+
+def reexec_on_private_bus():
+    """Restart this script under dbus-run-session unless already there"""
+    if os.environ.get(BUS_ENV_VAR):
+        return
+    os.environ[BUS_ENV_VAR] = '1'
+    try:
+        os.execvp('dbus-run-session',
+                  ['dbus-run-session', '--', sys.executable, __file__, *sys.argv[1:]])
+    except FileNotFoundError:
+        sys.exit("dbus-run-session not found (install dbus)")
+
+
+def isolate_home():
+    """Point HOME at a scratch directory so the user's config is untouched"""
+    home = tempfile.mkdtemp(prefix='simpleshot-bench-')
+    os.environ['HOME'] = home
+    return Path(home)
+
+
+reexec_on_private_bus()
+SCRATCH_HOME = isolate_home()
+sys.path.insert(0, str(REPO_DIR))
+
+import simpleshot  # noqa: E402
+from simpleshot import GLib, Gio, Gst  # noqa: E402
+from mock_portal import MockScreenCastPortal  # noqa: E402
+
+
+# Stream node ID -> (width, height) of the portal currently running
+STREAM_SIZES = {}
+
+
+def test_source_description(pipewire_fd, node_id, *properties):
+    """videotestsrc in place of pipewiresrc, in a typical compositor format"""
+    width, height = STREAM_SIZES[node_id]
+    return (f'videotestsrc is-live=true pattern=smpte '
+            f'! video/x-raw,format=BGRx,width={width},height={height},'
+            f'framerate={FRAMERATE}/1 ')
+
+
+simpleshot.pipewire_source_description = test_source_description
+
+
+class BenchApp:
+    """The parts of SimpleShotApp the capture classes use"""
+    
+    def __init__(self, config):
+        self.config = config
+        self.timing_log = simpleshot.TimingLog(config)
+        # Both live in the scratch config directory
+        self.history = simpleshot.CaptureHistory(config)
+        self.duplicates = simpleshot.DuplicateIndex(config)
+        self.save_queue = simpleshot.ScreenshotSaveQueue(self)
+        self.holds = 0
+    
+    def hold(self):
+        self.holds += 1
+    
+    def release(self):
+        self.holds -= 1
+
+
+def run_until(start, timeout=60):
+    """Run the main loop until start(done) calls done; return done's args"""
+    loop = GLib.MainLoop()
+    result = {}
+    
+    def done(*args):
+        result['args'] = args
+        loop.quit()
+    
+    def on_timeout():
+        loop.quit()
+        return False
+    
+    timeout_id = GLib.timeout_add_seconds(timeout, on_timeout)
+    start(done)
+    if 'args' not in result:
+        loop.run()
+    if 'args' not in result:
+        raise TimeoutError(f"no result after {timeout} s")
+    GLib.source_remove(timeout_id)
+    return result['args']
+
+
+def run_for(seconds):
+    """Run the main loop for a fixed time"""
+    loop = GLib.MainLoop()
+    GLib.timeout_add(int(seconds * 1000), loop.quit)
+    loop.run()
+
+
+def summarize(values):
+    """count/mean/p50/p95/max of a list of milliseconds"""
+    ordered = sorted(values)
+    return {
+        'n': len(ordered),
+        'mean': round(statistics.fmean(ordered), 3),
+        'p50': ordered[max(0, -(-len(ordered) * 50 // 100) - 1)],
+        'p95': ordered[max(0, -(-len(ordered) * 95 // 100) - 1)],
+        'max': ordered[-1],
+    }
+
+
+def elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 3)
+
+
+class PortalSession:
+    """A mock portal process plus a started ScreenCastSession against it"""
+    
+    def __init__(self, app, sizes):
+        self.app = app
+        self.sizes = sizes
+        self.process = None
+        self.session = None
+        self.start_ms = None
+    
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, str(BENCHMARK_DIR / 'mock_portal.py'),
+             *(arg for width, height in self.sizes for arg in ('--stream', f'{width}x{height}'))],
+            stdout=subprocess.PIPE, text=True)
+        if self.process.stdout.readline().strip() != 'ready':
+            raise RuntimeError("mock portal did not start")
+        
+        STREAM_SIZES.clear()
+        for index, size in enumerate(self.sizes):
+            STREAM_SIZES[MockScreenCastPortal.FIRST_NODE_ID + index] = size
+        
+        self.session = simpleshot.ScreenCastSession(self.app, self.app.config)
+        # The portal derives request object paths from our unique name
+        unique_name = Gio.bus_get_sync(Gio.BusType.SESSION, None).get_unique_name()
+        self.session.sender_token = unique_name[1:].replace('.', '_')
+        
+        started = time.perf_counter()
+        (success,) = run_until(self.session.start_session)
+        self.start_ms = elapsed_ms(started)
+        if not success:
+            raise RuntimeError("ScreenCast session did not start")
+        return self
+    
+    def __exit__(self, *exc_info):
+        if self.session:
+            self.session.close_session()
+        if self.process:
+            self.process.terminate()
+            self.process.wait()
+        return False
+    
+    def grab(self, stream, settle):
+        """Capture a frame; return (frame, milliseconds)"""
+        started = time.perf_counter()
+        (frame,) = run_until(
+            lambda done: self.session.capture_frame(stream, done, settle))
+        if frame is None:
+            raise RuntimeError("no frame captured")
+        return frame, elapsed_ms(started)
+
+
+def bench_latency(app, args):
+    results = []
+    for name in args.resolutions:
+        size = RESOLUTIONS[name]
+        with PortalSession(app, [size]) as portal:
+            stream = portal.session.streams[0]
+            frame, first_frame_ms = portal.grab(stream, settle=False)
+            latest = [portal.grab(stream, settle=False)[1] for _ in range(args.iterations)]
+            settled = [portal.grab(stream, settle=True)[1] for _ in range(args.iterations)]
+            results.append({
+                'resolution': f'{size[0]}x{size[1]}',
+                'session_start_ms': portal.start_ms,
+                'first_frame_ms': first_frame_ms,
+                'grab_latest_ms': summarize(latest),
+                'grab_settled_ms': summarize(settled),
+            })
+    return results
+
+
+def bench_burst(app, args):
+    results = []
+    size = RESOLUTIONS['4k']
+    with PortalSession(app, [size]) as portal:
+        stream = portal.session.streams[0]
+        portal.grab(stream, settle=False)
+        for key in args.image_formats:
+            app.config.image_format = key
+            app.config.picture_dir = str(SCRATCH_HOME / 'burst' / key)
+            os.makedirs(app.config.picture_dir, exist_ok=True)
+            crop = (960, 540, 1920, 1080)
+            
+            started = time.perf_counter()
+            (sequence,) = run_until(lambda done: simpleshot.CaptureSequence(
+                app, app.config, portal.session, stream, lambda frame: crop, 'burst',
+                args.burst_interval_ms, args.burst_count, done).start())
+            total_ms = elapsed_ms(started)
+            results.append({
+                'resolution': f'{size[0]}x{size[1]}',
+                'crop': list(crop),
+                'image_format': key,
+                'interval_ms': args.burst_interval_ms,
+                'frames': args.burst_count,
+                'saved': sequence.saved,
+                'failed': sequence.failed,
+                'total_ms': total_ms,
+                'frames_per_second': round(sequence.saved / (total_ms / 1000), 2),
+            })
+    return results
+
+
+def bench_crop_save(app, args):
+    results = []
+    size = RESOLUTIONS['4k']
+    with PortalSession(app, [size]) as portal:
+        frame, _ = portal.grab(portal.session.streams[0], settle=False)
+    
+    out_dir = SCRATCH_HOME / 'crop_save'
+    out_dir.mkdir(exist_ok=True)
+    for label, rect in (('full', (0, 0) + size), ('1080p', (960, 540, 1920, 1080))):
+        for key in args.image_formats:
+            image_format = simpleshot.IMAGE_FORMATS[key]
+            crop_ms, encode_ms, write_ms = [], [], []
+            for i in range(args.iterations):
+                started = time.perf_counter()
+                cropped = frame.crop(*rect)
+                crop_ms.append(elapsed_ms(started))
+                
+                started = time.perf_counter()
+                data = image_format.encode(cropped, app.config.png_compression,
+                                           app.config.image_quality)
+                encode_ms.append(elapsed_ms(started))
+                
+                started = time.perf_counter()
+                path = simpleshot.ScreenshotSaveQueue.write_atomically(
+                    str(out_dir / f'{label}-{key}-{i}.{image_format.extension}'), data, False)
+                write_ms.append(elapsed_ms(started))
+                os.unlink(path)
+            
+            results.append({
+                'source': f'{size[0]}x{size[1]}',
+                'crop': label,
+                'image_format': key,
+                'bytes': len(data),
+                'crop_ms': summarize(crop_ms),
+                'encode_ms': summarize(encode_ms),
+                'write_ms': summarize(write_ms),
+            })
+    return results
+
+
+def bench_recording(app, args):
+    results = []
+    for name in args.recording_resolutions:
+        size = RESOLUTIONS[name]
+        with PortalSession(app, [size]) as portal:
+            stream = portal.session.streams[0]
+            portal.grab(stream, settle=False)
+            # Every encoder on a static test pattern with skipping off, plus
+            # the default encoder with it on to show what idle screens cost
+            variants = [(key, False) for key in args.encoders]
+            if simpleshot.DEFAULT_ENCODER in args.encoders:
+                variants.append((simpleshot.DEFAULT_ENCODER, True))
+            for key, skip_unchanged in variants:
+                backend = simpleshot.ENCODER_BACKENDS[key]
+                app.config.encoder = key
+                app.config.skip_unchanged_frames = skip_unchanged
+                path = SCRATCH_HOME / f'recording-{name}-{key}.{backend.extension}'
+                if not portal.session.start_recording(stream, str(path)):
+                    results.append({'resolution': f'{size[0]}x{size[1]}', 'encoder': key,
+                                    'skip_unchanged': skip_unchanged,
+                                    'error': "recording did not start"})
+                    continue
+                
+                stats = portal.session.recording_stats
+                run_for(args.duration)
+                stop_started = time.perf_counter()
+                (success,) = run_until(portal.session.stop_recording)
+                summary = stats.get_summary()
+                
+                results.append({
+                    'resolution': f'{size[0]}x{size[1]}',
+                    'encoder': key,
+                    'skip_unchanged': skip_unchanged,
+                    'success': success,
+                    'source_fps': FRAMERATE,
+                    'captured_frames': summary['captured_frames'],
+                    'encoded_frames': summary['encoded_frames'],
+                    'skipped_frames': summary['skipped_frames'],
+                    'encoded_fps': summary['average_fps'],
+                    'dropped_frames': summary['dropped_frames'],
+                    'max_queue_depth': summary['max_queue_depth'],
+                    'cpu_percent': round(summary['cpu_seconds'] / summary['duration'] * 100, 1),
+                    'stop_ms': elapsed_ms(stop_started),
+                    'bytes': path.stat().st_size if path.exists() else 0,
+                })
+                if path.exists():
+                    path.unlink()
+    return results
+
+
+SCENARIOS = {
+    'latency': bench_latency,
+    'burst': bench_burst,
+    'crop_save': bench_crop_save,
+    'recording': bench_recording,
+}
+
+
+def describe_environment():
+    try:
+        commit = subprocess.run(['git', '-C', str(REPO_DIR), 'rev-parse', 'HEAD'],
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'host': socket.gethostname(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'gstreamer': Gst.version_string(),
+        'commit': commit,
+    }
+
+
+def flatten(results, prefix=''):
+    """{"scenario/label/metric[.stat]": value} for comparisons"""
+    metrics = {}
+    for scenario, rows in results.items():
+        for row in rows:
+            label = '/'.join(str(row[key]) for key in
+                             ('resolution', 'source', 'crop', 'image_format', 'encoder',
+                              'skip_unchanged')
+                             if key in row and not isinstance(row[key], list))
+            for metric, value in row.items():
+                if isinstance(value, dict):
+                    for stat in ('p50', 'p95'):
+                        metrics[f'{scenario}/{label}/{metric}.{stat}'] = value[stat]
+                elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                    metrics[f'{scenario}/{label}/{metric}'] = value
+    return metrics
+
+
+# Metrics where a larger value is an improvement; the rest are times
+HIGHER_IS_BETTER = ('frames_per_second', 'encoded_fps', 'saved', 'encoded_frames')
+# Inputs and sizes that are not regressions either way
+NOT_COMPARED = ('n', 'frames', 'interval_ms', 'source_fps', 'bytes', 'captured_frames',
+                'max_queue_depth')
+
+
+def compare(baseline, current, max_regression):
+    """Print changes against a baseline; return the number of regressions"""
+    old = flatten(baseline['results'])
+    new = flatten(current['results'])
+    regressions = 0
+    print(f"{'metric':<60} {'baseline':>10} {'current':>10} {'change':>8}")
+    for metric in sorted(old.keys() & new.keys()):
+        name = metric.rsplit('/', 1)[1].split('.')[0]
+        if name in NOT_COMPARED or not old[metric]:
+            continue
+        change = (new[metric] - old[metric]) / old[metric] * 100
+        worse = -change if name in HIGHER_IS_BETTER else change
+        flag = ''
+        if max_regression is not None and worse > max_regression:
+            flag = '  REGRESSION'
+            regressions += 1
+        print(f"{metric:<60} {old[metric]:>10} {new[metric]:>10} {change:>+7.1f}%{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="SimpleShot capture benchmarks against a mock ScreenCast portal")
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='scenario to run (repeatable, default all)')
+    parser.add_argument('--quick', action='store_true',
+                        help='fewer iterations and no 8K, for a smoke run')
+    parser.add_argument('--iterations', type=int, help='samples per measurement')
+    parser.add_argument('--duration', type=float, help='seconds per recording')
+    parser.add_argument('--output', default='benchmark-results.json',
+                        help='where to write the JSON results')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='results file to compare against')
+    parser.add_argument('--max-regression', type=float, metavar='PERCENT',
+                        help='exit with status 1 if a metric is this much worse')
+    args = parser.parse_args()
+    
+    args.iterations = args.iterations or (5 if args.quick else 20)
+    args.duration = args.duration or (2 if args.quick else 5)
+    args.resolutions = ['1080p', '4k'] if args.quick else list(RESOLUTIONS)
+    args.recording_resolutions = ['1080p'] if args.quick else ['1080p', '4k']
+    args.burst_count = 10 if args.quick else 30
+    args.burst_interval_ms = 50
+    args.image_formats = [key for key, image_format in simpleshot.IMAGE_FORMATS.items()
+                          if image_format.is_available()]
+    args.encoders = [key for key, backend in simpleshot.ENCODER_BACKENDS.items()
+                     if backend.is_available()]
+    
+    config = simpleshot.SimpleShotConfig()
+    app = BenchApp(config)
+    
+    results = {}
+    for name in args.scenario or list(SCENARIOS):
+        print(f"Running {name}...", file=sys.stderr)
+        results[name] = SCENARIOS[name](app, args)
+    
+    report = {
+        'schema': SCHEMA_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': describe_environment(),
+        'parameters': {
+            'iterations': args.iterations,
+            'recording_seconds': args.duration,
+            'framerate': FRAMERATE,
+            'burst_count': args.burst_count,
+            'burst_interval_ms': args.burst_interval_ms,
+            'image_formats': args.image_formats,
+            'encoders': args.encoders,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+        f.write('\n')
+    print(f"Results written to {args.output}", file=sys.stderr)
+    
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('schema') != SCHEMA_VERSION:
+            print(f"Baseline schema {baseline.get('schema')} differs from {SCHEMA_VERSION}",
+                  file=sys.stderr)
+        if compare(baseline, report, args.max_regression):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,15 +7,384 @@ Uses org.freedesktop.portal.ScreenCast for all capture functionality
 import sys
 import os
 import gi
-import subprocess
 import json
+import collections
+import hashlib
+import queue
+import shutil
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
 gi.require_version('Gtk', '4.0')
 gi.require_version('Gdk', '4.0')
+gi.require_version('Gsk', '4.0')
 gi.require_version('Adw', '1')
-from gi.repository import Gtk, Gdk, Adw, GLib, Gio, GdkPixbuf
+gi.require_version('Gst', '1.0')
+gi.require_version('GstVideo', '1.0')
+from gi.repository import Gtk, Gdk, Gsk, Graphene, Adw, GLib, Gio, GdkPixbuf, Gst, GstVideo
+
+Gst.init(None)
+
+# Capture, encode and file-write work runs here so it never blocks the GTK
+# main loop
+_worker_pool = ThreadPoolExecutor(max_workers=max(2, os.cpu_count() or 1),
+                                  thread_name_prefix='simpleshot-worker')
+
+
+def run_in_background(work, callback, *args):
+    """Run work(*args) on the worker pool
+    
+    callback(result, error) is invoked on the main loop when it finishes.
+    """
+    def finish(result, error):
+        callback(result, error)
+        return False
+    
+    def task():
+        try:
+            result, error = work(*args), None
+        except Exception as e:
+            result, error = None, e
+        GLib.idle_add(finish, result, error)
+    
+    _worker_pool.submit(task)
+
+
+def run_pipeline_to_eos(app, pipeline, callback, feed=None, timeout=None):
+    """Play a finite pipeline; callback(success) runs on the main loop at EOS
+    
+    feed(), if given, runs once the pipeline is started, e.g. to push data
+    into an appsrc; returning False fails the run. A pipeline that has not
+    finished after timeout seconds fails too. The application is held
+    until the pipeline has finished.
+    """
+    state = {'done': False, 'timeout_id': 0}
+    
+    def on_message(bus, message):
+        if message.type == Gst.MessageType.EOS:
+            finish(True)
+        elif message.type == Gst.MessageType.ERROR:
+            error, debug = message.parse_error()
+            print(f"Pipeline error: {error.message}")
+            finish(False)
+    
+    def on_timeout():
+        state['timeout_id'] = 0
+        print(f"Pipeline did not finish within {timeout} s")
+        finish(False)
+        return False
+    
+    def finish(success):
+        if state['done']:
+            return
+        state['done'] = True
+        if state['timeout_id']:
+            GLib.source_remove(state['timeout_id'])
+        bus.remove_signal_watch()
+        pipeline.set_state(Gst.State.NULL)
+        app.release()
+        callback(success)
+    
+    app.hold()
+    bus = pipeline.get_bus()
+    bus.add_signal_watch()
+    bus.connect('message', on_message)
+    if pipeline.set_state(Gst.State.PLAYING) == Gst.StateChangeReturn.FAILURE:
+        finish(False)
+        return
+    if timeout:
+        state['timeout_id'] = GLib.timeout_add_seconds(timeout, on_timeout)
+    if feed and not feed():
+        finish(False)
+
+
+def capture_timestamp():
+    """Millisecond-resolution timestamp used in capture file names"""
+    now = datetime.now()
+    return now.strftime("%Y-%m-%d_%H-%M-%S.") + f"{now.microsecond // 1000:03d}"
+
+
+def clamp_to_frame(x, y, width, height, frame_width, frame_height):
+    """Clip a rectangle to a frame and return it as integers
+    
+    Returns None if the rectangle does not overlap the frame.
+    """
+    left = max(0, int(x))
+    top = max(0, int(y))
+    right = min(frame_width, int(x + width))
+    bottom = min(frame_height, int(y + height))
+    if right <= left or bottom <= top:
+        return None
+    return left, top, right - left, bottom - top
+
+
+def parse_region(text):
+    """Parse an "X,Y,WIDTH,HEIGHT" region in desktop coordinates"""
+    try:
+        x, y, width, height = (int(value) for value in text.split(','))
+    except ValueError:
+        raise ValueError(f"Invalid region '{text}', expected X,Y,WIDTH,HEIGHT")
+    if width <= 0 or height <= 0:
+        raise ValueError(f"Invalid region '{text}', size must be positive")
+    return x, y, width, height
+
+
+def pipewire_source_description(pipewire_fd, node_id, *properties):
+    """gst-launch description of the source element for a ScreenCast stream
+    
+    properties are extra "name=value" pipewiresrc properties. The benchmark
+    harness swaps this out to feed pipelines from videotestsrc.
+    """
+    return ' '.join([f'pipewiresrc fd={pipewire_fd} path={node_id}', *properties]) + ' '
+
+
+def reserve_capture_path(path):
+    """Atomically create an empty file at path and return its name
+    
+    If path is taken, a -1, -2, ... counter is added before the extension,
+    so concurrent or scripted captures never overwrite each other.
+    """
+    stem, extension = os.path.splitext(path)
+    counter = 0
+    while True:
+        candidate = path if counter == 0 else f"{stem}-{counter}{extension}"
+        try:
+            fd = os.open(candidate, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            counter += 1
+            continue
+        os.close(fd)
+        return candidate
+
+class EncoderBackend:
+    """A selectable recording encoder and the container it is muxed into"""
+    
+    def __init__(self, key, label, encoder, muxer, extension,
+                 thread_property='threads', max_threads=None,
+                 speed_property=None, speed_levels=(), keyframe_property=None):
+        self.key = key
+        self.label = label
+        self.encoder = encoder
+        self.muxer = muxer
+        self.extension = extension
+        self.thread_property = thread_property
+        self.max_threads = max_threads
+        # Encoder property that can be changed while recording, and its
+        # values from best quality to fastest (see AdaptiveQualityController)
+        self.speed_property = speed_property
+        self.speed_levels = speed_levels
+        # Maximum frames between keyframes; intra-only codecs have none
+        self.keyframe_property = keyframe_property
+    
+    def get_threads(self):
+        """Number of encoder threads to use on this machine"""
+        threads = os.cpu_count() or 1
+        if self.max_threads:
+            threads = min(threads, self.max_threads)
+        return threads
+    
+    def is_available(self):
+        """Check that the encoder and muxer elements are installed"""
+        for description in (self.encoder, self.muxer):
+            factory_name = description.split()[0]
+            if not Gst.ElementFactory.find(factory_name):
+                return False
+        return True
+    
+    def get_encoder_description(self):
+        """gst-launch style description of the encode stage"""
+        encoder = self.encoder
+        if self.thread_property:
+            encoder += f' {self.thread_property}={self.get_threads()}'
+        return f'{encoder} name=encoder'
+    
+    def get_pipeline_description(self):
+        """gst-launch style description of the encode and mux stages"""
+        return f'{self.get_encoder_description()} ! {self.muxer}'
+
+
+# Recording encoders, in the order they are offered in settings
+ENCODER_BACKENDS = {
+    backend.key: backend for backend in (
+        EncoderBackend(
+            'vp9', "VP9 (WebM)",
+            'vp9enc deadline=1 cpu-used=8 row-mt=true tile-columns=4 '
+            'end-usage=cq cq-level=30 target-bitrate=2000000',
+            'webmmux', 'webm', max_threads=16,
+            speed_property='cpu-used', speed_levels=(5, 6, 7, 8),
+            keyframe_property='keyframe-max-dist'),
+        EncoderBackend(
+            'vp8', "VP8 (WebM)",
+            'vp8enc deadline=1 cpu-used=8 token-partitions=3 '
+            'end-usage=vbr target-bitrate=2000000',
+            'webmmux', 'webm', max_threads=8,
+            speed_property='cpu-used', speed_levels=(4, 6, 8, 12, 16),
+            keyframe_property='keyframe-max-dist'),
+        EncoderBackend(
+            'x264-ultrafast', "H.264 ultrafast (MKV)",
+            'x264enc speed-preset=ultrafast tune=zerolatency bitrate=4000',
+            'matroskamux', 'mkv', keyframe_property='key-int-max'),
+        EncoderBackend(
+            'x264-veryfast', "H.264 veryfast (MKV)",
+            'x264enc speed-preset=veryfast tune=zerolatency bitrate=3000',
+            'matroskamux', 'mkv', keyframe_property='key-int-max'),
+        EncoderBackend(
+            'ffv1', "FFV1 lossless (MKV)",
+            'avenc_ffv1',
+            'matroskamux', 'mkv'),
+    )
+}
+DEFAULT_ENCODER = 'vp9'
+
+
+def get_encoder_backend(key):
+    """Return the backend for key, falling back to the default encoder"""
+    backend = ENCODER_BACKENDS.get(key)
+    if backend is None or not backend.is_available():
+        backend = ENCODER_BACKENDS[DEFAULT_ENCODER]
+    return backend
+
+
+# Adaptive recording targets, in the order they are offered in settings
+RECORDING_TARGETS = {
+    'fixed': "Fixed settings",
+    'no-drops': "Never drop frames",
+    'cpu': "Stay under CPU limit",
+}
+DEFAULT_RECORDING_TARGET = 'fixed'
+
+# What to do with a screenshot whose content was saved before
+DEDUP_MODES = {
+    'off': "Save every screenshot",
+    'skip': "Skip duplicates",
+    'link': "Hard link to the earlier file",
+}
+DEFAULT_DEDUP_MODE = 'off'
+
+
+class ImageFormat:
+    """A screenshot output format and how to encode it
+    
+    Formats are encoded either with a GdkPixbuf saver (pixbuf_type) or with
+    a one-shot GStreamer encoder (gst_encoder, a gst-launch description
+    that may use {quality}).
+    """
+    
+    # Longest a one-shot GStreamer encode may take
+    ENCODE_TIMEOUT = 10 * Gst.SECOND
+    
+    def __init__(self, key, label, extension, pixbuf_type=None, gst_encoder=None,
+                 uses_compression=False, uses_quality=False):
+        self.key = key
+        self.label = label
+        self.extension = extension
+        self.pixbuf_type = pixbuf_type
+        self.gst_encoder = gst_encoder
+        self.uses_compression = uses_compression
+        self.uses_quality = uses_quality
+    
+    def is_available(self):
+        """Check that a saver or encoder for the format is installed"""
+        if self.pixbuf_type:
+            return any(fmt.get_name() == self.pixbuf_type and fmt.is_writable()
+                       for fmt in GdkPixbuf.Pixbuf.get_formats())
+        return Gst.ElementFactory.find(self.gst_encoder.split()[0]) is not None
+    
+    def encode(self, frame, compression, quality):
+        """Encode frame into an in-memory buffer"""
+        if self.pixbuf_type:
+            keys, values = [], []
+            if self.uses_compression:
+                keys.append('compression')
+                values.append(str(compression))
+            if self.uses_quality:
+                keys.append('quality')
+                values.append(str(quality))
+            success, data = frame.to_pixbuf().save_to_bufferv(self.pixbuf_type, keys, values)
+            if not success:
+                raise RuntimeError(f"{self.label} encoding failed")
+            return data
+        
+        return self._encode_with_gstreamer(frame, self.gst_encoder.format(quality=quality))
+    
+    def _encode_with_gstreamer(self, frame, encoder):
+        """Push one frame through appsrc ! encoder ! appsink (blocking)"""
+        pipeline = Gst.parse_launch(
+            f'appsrc name=src format=time ! videoconvert ! {encoder} '
+            '! appsink name=sink sync=false'
+        )
+        src = pipeline.get_by_name('src')
+        src.set_property('caps', Gst.Caps.from_string(
+            f'video/x-raw,format=RGBA,width={frame.width},height={frame.height},framerate=0/1'))
+        sink = pipeline.get_by_name('sink')
+        
+        try:
+            if pipeline.set_state(Gst.State.PLAYING) == Gst.StateChangeReturn.FAILURE:
+                raise RuntimeError(f"Could not start the {self.label} encoder")
+            src.emit('push-buffer', Gst.Buffer.new_wrapped(frame.data))
+            src.emit('end-of-stream')
+            sample = sink.emit('try-pull-sample', self.ENCODE_TIMEOUT)
+            if sample is None:
+                # Report the encoder's error if it posted one, else the timeout
+                message = pipeline.get_bus().pop_filtered(Gst.MessageType.ERROR)
+                if message:
+                    error, _ = message.parse_error()
+                    raise RuntimeError(f"{self.label} encoding failed: {error.message}")
+                raise RuntimeError(f"{self.label} encoding timed out")
+            buffer = sample.get_buffer()
+            return buffer.extract_dup(0, buffer.get_size())
+        finally:
+            pipeline.set_state(Gst.State.NULL)
+
+
+# Screenshot formats, in the order they are offered in settings
+IMAGE_FORMATS = {
+    image_format.key: image_format for image_format in (
+        # GdkPixbuf's PNG saver takes the zlib level only, not a filter strategy
+        ImageFormat('png', "PNG", 'png', pixbuf_type='png', uses_compression=True),
+        ImageFormat('jpeg', "JPEG", 'jpg', pixbuf_type='jpeg', uses_quality=True),
+        ImageFormat('webp', "WebP", 'webp',
+                    gst_encoder='webpenc quality={quality}', uses_quality=True),
+        # Lossless WebP treats quality as effort and speed as the libwebp
+        # method; 0 is the fastest for both
+        ImageFormat('webp-lossless', "WebP lossless (fast)", 'webp',
+                    gst_encoder='webpenc lossless=true quality=0 speed=0'),
+    )
+}
+DEFAULT_IMAGE_FORMAT = 'png'
+
+
+def get_image_format_for_path(path, default_key):
+    """Pick the image format matching path's extension, else default_key
+    
+    default_key wins when its extension matches, so a configured lossless
+    WebP is kept for a .webp path.
+    """
+    extension = os.path.splitext(path)[1].lstrip('.').lower()
+    if extension == 'jpeg':
+        extension = 'jpg'
+    default_format = get_image_format(default_key)
+    if default_format.extension == extension:
+        return default_format
+    for image_format in IMAGE_FORMATS.values():
+        if image_format.extension == extension and image_format.is_available():
+            return image_format
+    return default_format
+
+
+def get_image_format(key):
+    """Return the image format for key, falling back to PNG"""
+    image_format = IMAGE_FORMATS.get(key)
+    if image_format is None or not image_format.is_available():
+        image_format = IMAGE_FORMATS[DEFAULT_IMAGE_FORMAT]
+    return image_format
+
 
 class SimpleShotConfig:
     """Configuration manager for SimpleShot"""
@@ -29,6 +398,66 @@ class SimpleShotConfig:
         self.picture_dir = str(Path.home() / 'Pictures' / 'Screenshots')
         self.video_dir = str(Path.home() / 'Videos' / 'Recordings')
         
+        # Recording encoder (key into ENCODER_BACKENDS)
+        self.encoder = DEFAULT_ENCODER
+        
+        # Screenshot output format (key into IMAGE_FORMATS), PNG zlib level
+        # (0-9, lower is faster) and JPEG/WebP quality (1-100)
+        self.image_format = DEFAULT_IMAGE_FORMAT
+        self.png_compression = 6
+        self.image_quality = 90
+        
+        # Write screenshots to picture_dir; when off they only go to the
+        # clipboard
+        self.save_screenshots = True
+        
+        # fsync screenshots (and their directory) before reporting them saved
+        self.fsync_screenshots = False
+        
+        # Duplicate screenshots (key into DEDUP_MODES); with dedup_perceptual
+        # screenshots at most dedup_threshold bits of perceptual hash apart
+        # count as duplicates too
+        self.dedup_mode = DEFAULT_DEDUP_MODE
+        self.dedup_perceptual = False
+        self.dedup_threshold = 2
+        
+        # Burst: burst_count frames burst_interval_ms apart; interval mode
+        # takes one shot every interval_seconds until stopped
+        self.burst_count = 10
+        self.burst_interval_ms = 100
+        self.interval_seconds = 5
+        
+        # Record per-stage capture timings (see TimingLog)
+        self.timing_log = False
+        
+        # Write <recording>.stats.json next to each recording
+        self.recording_stats = False
+        
+        # Adaptive recording quality (key into RECORDING_TARGETS) and the
+        # share of all CPU cores the 'cpu' target keeps SimpleShot under
+        self.recording_target = DEFAULT_RECORDING_TARGET
+        self.recording_max_cpu = 50
+        
+        # Leave frames identical to the previous one out of recordings
+        # (variable framerate output)
+        self.skip_unchanged_frames = True
+        
+        # Crash-safe recording: write segments of this many seconds and
+        # join them after stop (0 writes a single file)
+        self.segment_seconds = 0
+        
+        # Instant replay: seconds of encoded video kept in memory, and the
+        # most memory the ring may use
+        self.replay_seconds = 30
+        self.replay_max_mb = 256
+        
+        # Freeze the screen while selecting and crop from that frame
+        self.precapture = False
+        
+        # ScreenCast portal restore token, so later launches can skip the
+        # source selection dialog
+        self.restore_token = ''
+        
         self.load_config()
     
     def load_config(self):
@@ -42,6 +471,53 @@ class SimpleShotConfig:
                             self.picture_dir = value
                         elif key == 'video_dir':
                             self.video_dir = value
+                        elif key == 'encoder':
+                            self.encoder = value
+                        elif key == 'restore_token':
+                            self.restore_token = value
+                        elif key == 'precapture':
+                            self.precapture = value == 'true'
+                        elif key == 'save_screenshots':
+                            self.save_screenshots = value == 'true'
+                        elif key == 'fsync_screenshots':
+                            self.fsync_screenshots = value == 'true'
+                        elif key == 'dedup_mode':
+                            if value in DEDUP_MODES:
+                                self.dedup_mode = value
+                        elif key == 'dedup_perceptual':
+                            self.dedup_perceptual = value == 'true'
+                        elif key == 'dedup_threshold':
+                            self.dedup_threshold = max(
+                                0, min(DuplicateIndex.PERCEPTUAL_MAX_DISTANCE, int(value)))
+                        elif key == 'burst_count':
+                            self.burst_count = max(2, int(value))
+                        elif key == 'burst_interval_ms':
+                            self.burst_interval_ms = max(10, int(value))
+                        elif key == 'interval_seconds':
+                            self.interval_seconds = max(1, int(value))
+                        elif key == 'timing_log':
+                            self.timing_log = value == 'true'
+                        elif key == 'recording_stats':
+                            self.recording_stats = value == 'true'
+                        elif key == 'recording_target':
+                            if value in RECORDING_TARGETS:
+                                self.recording_target = value
+                        elif key == 'recording_max_cpu':
+                            self.recording_max_cpu = max(5, min(100, int(value)))
+                        elif key == 'skip_unchanged_frames':
+                            self.skip_unchanged_frames = value == 'true'
+                        elif key == 'segment_seconds':
+                            self.segment_seconds = max(0, min(300, int(value)))
+                        elif key == 'replay_seconds':
+                            self.replay_seconds = max(5, min(600, int(value)))
+                        elif key == 'replay_max_mb':
+                            self.replay_max_mb = max(16, min(4096, int(value)))
+                        elif key == 'image_format':
+                            self.image_format = value
+                        elif key == 'png_compression':
+                            self.png_compression = max(0, min(9, int(value)))
+                        elif key == 'image_quality':
+                            self.image_quality = max(1, min(100, int(value)))
             except Exception as e:
                 print(f"Error loading config: {e}")
     
@@ -51,10 +527,551 @@ class SimpleShotConfig:
             with open(self.config_file, 'w') as f:
                 f.write(f"picture_dir={self.picture_dir}\n")
                 f.write(f"video_dir={self.video_dir}\n")
+                f.write(f"encoder={self.encoder}\n")
+                f.write(f"restore_token={self.restore_token}\n")
+                f.write(f"precapture={'true' if self.precapture else 'false'}\n")
+                f.write(f"save_screenshots={'true' if self.save_screenshots else 'false'}\n")
+                f.write(f"fsync_screenshots={'true' if self.fsync_screenshots else 'false'}\n")
+                f.write(f"dedup_mode={self.dedup_mode}\n")
+                f.write(f"dedup_perceptual={'true' if self.dedup_perceptual else 'false'}\n")
+                f.write(f"dedup_threshold={self.dedup_threshold}\n")
+                f.write(f"burst_count={self.burst_count}\n")
+                f.write(f"burst_interval_ms={self.burst_interval_ms}\n")
+                f.write(f"interval_seconds={self.interval_seconds}\n")
+                f.write(f"timing_log={'true' if self.timing_log else 'false'}\n")
+                f.write(f"recording_stats={'true' if self.recording_stats else 'false'}\n")
+                f.write(f"recording_target={self.recording_target}\n")
+                f.write(f"recording_max_cpu={self.recording_max_cpu}\n")
+                f.write(f"skip_unchanged_frames={'true' if self.skip_unchanged_frames else 'false'}\n")
+                f.write(f"segment_seconds={self.segment_seconds}\n")
+                f.write(f"replay_seconds={self.replay_seconds}\n")
+                f.write(f"replay_max_mb={self.replay_max_mb}\n")
+                f.write(f"image_format={self.image_format}\n")
+                f.write(f"png_compression={self.png_compression}\n")
+                f.write(f"image_quality={self.image_quality}\n")
         except Exception as e:
             print(f"Error saving config: {e}")
 
 
+class CaptureTimings:
+    """Monotonic timestamps for the stages of one capture
+    
+    Stages are marked in order as the capture progresses (from any
+    thread); finish() writes the record to the timing log. When timing is
+    disabled every call is a no-op.
+    """
+    
+    def __init__(self, log, kind, enabled=True):
+        self.log = log
+        self.kind = kind
+        self.enabled = enabled
+        self.started = time.monotonic()
+        self.last_mark = self.started
+        self.stages = {}
+        self.lock = threading.Lock()
+        self.finished = False
+    
+    def mark(self, stage):
+        """Record that stage has just ended"""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        with self.lock:
+            self.stages[stage] = round((now - self.last_mark) * 1000, 3)
+            self.last_mark = now
+    
+    @contextmanager
+    def stage(self, stage):
+        """Time a block as its own stage, independent of mark() order"""
+        if not self.enabled:
+            yield
+            return
+        began = time.monotonic()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.stages[stage] = round((time.monotonic() - began) * 1000, 3)
+    
+    def finish(self, **details):
+        """Write the record; details are added as extra fields"""
+        if not self.enabled:
+            return
+        with self.lock:
+            if self.finished:
+                return
+            self.finished = True
+            record = {
+                'time': datetime.now().isoformat(timespec='milliseconds'),
+                'kind': self.kind,
+                'stages': dict(self.stages),
+                'total': round((time.monotonic() - self.started) * 1000, 3),
+            }
+        record.update(details)
+        self.log.write(record)
+
+
+class TimingLog:
+    """JSON-lines log of capture stage timings under config_dir
+    
+    Enabled by the timing_log setting or by setting SIMPLESHOT_TIMING=1.
+    """
+    
+    ENV_VAR = 'SIMPLESHOT_TIMING'
+    
+    def __init__(self, config):
+        self.config = config
+        self.path = config.config_dir / 'timings.jsonl'
+        self.lock = threading.Lock()
+    
+    def is_enabled(self):
+        return self.config.timing_log or os.environ.get(self.ENV_VAR, '') not in ('', '0')
+    
+    def begin(self, kind):
+        """Start timing a capture of the given kind"""
+        return CaptureTimings(self, kind, self.is_enabled())
+    
+    def write(self, record):
+        """Append a record off the main loop"""
+        _worker_pool.submit(self._append, json.dumps(record))
+    
+    def _append(self, line):
+        try:
+            with self.lock, open(self.path, 'a') as f:
+                f.write(line + '\n')
+        except OSError as e:
+            print(f"Error writing timing log: {e}")
+    
+    def summarize(self):
+        """Return {kind: {stage: (count, p50, p95)}} in milliseconds"""
+        samples = {}
+        try:
+            with open(self.path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    stages = dict(record.get('stages', {}))
+                    stages['total'] = record.get('total', 0)
+                    kind_samples = samples.setdefault(record.get('kind', '?'), {})
+                    for stage, value in stages.items():
+                        kind_samples.setdefault(stage, []).append(value)
+        except FileNotFoundError:
+            return {}
+        
+        summary = {}
+        for kind, stages in samples.items():
+            summary[kind] = {
+                stage: (len(values), self._percentile(values, 50), self._percentile(values, 95))
+                for stage, values in stages.items()
+            }
+        return summary
+    
+    @staticmethod
+    def _percentile(values, percent):
+        """Nearest-rank percentile"""
+        ordered = sorted(values)
+        rank = max(1, -(-len(ordered) * percent // 100))
+        return ordered[int(rank) - 1]
+    
+    def format_summary(self):
+        """Human-readable p50/p95 table of the log"""
+        summary = self.summarize()
+        if not summary:
+            return f"No timings recorded in {self.path}"
+        
+        lines = []
+        for kind, stages in sorted(summary.items()):
+            lines.append(f"{kind}:")
+            lines.append(f"  {'stage':<20} {'count':>7} {'p50 ms':>10} {'p95 ms':>10}")
+            for stage, (count, p50, p95) in stages.items():
+                lines.append(f"  {stage:<20} {count:>7} {p50:>10.1f} {p95:>10.1f}")
+        return "\n".join(lines)
+
+
+class CaptureHistory:
+    """SQLite index of saved captures under config_dir
+    
+    Captures are added as they are saved, so browsing never has to list or
+    decode the capture folders. Safe to use from the save workers.
+    """
+    
+    PAGE_SIZE = 50
+    
+    def __init__(self, config):
+        self.path = config.config_dir / 'history.sqlite3'
+        self.lock = threading.Lock()
+        try:
+            self.connection = sqlite3.connect(str(self.path), check_same_thread=False)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS captures ('
+                'id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE, kind TEXT NOT NULL, '
+                'created REAL NOT NULL, size INTEGER, width INTEGER, height INTEGER, '
+                'monitor TEXT, region TEXT, format TEXT, duration REAL)')
+            self.connection.commit()
+        except sqlite3.Error as e:
+            print(f"Error opening capture history: {e}")
+            self.connection = None
+    
+    def _execute(self, sql, params=()):
+        """Run a statement under the lock; returns all rows, or [] on error"""
+        if self.connection is None:
+            return []
+        try:
+            with self.lock:
+                rows = self.connection.execute(sql, params).fetchall()
+                self.connection.commit()
+                return rows
+        except sqlite3.Error as e:
+            print(f"Capture history error: {e}")
+            return []
+    
+    def add(self, path, kind, width=None, height=None, monitor=None, region=None,
+            file_format=None, duration=None, size=None):
+        """Index a saved capture; region is (x, y, width, height) in stream pixels"""
+        path = os.path.abspath(path)
+        if size is None:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                return
+        if region is not None:
+            region = ','.join(str(int(value)) for value in region)
+        # Replacing a path gives it a new id, so it sorts as the newest
+        self._execute(
+            'INSERT OR REPLACE INTO captures '
+            '(path, kind, created, size, width, height, monitor, region, format, duration) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (path, kind, time.time(), size, width, height, monitor, region, file_format,
+             duration))
+    
+    def remove(self, path):
+        self._execute('DELETE FROM captures WHERE path = ?', (path,))
+    
+    def count(self):
+        """Number of captures in the history"""
+        rows = self._execute('SELECT COUNT(*) FROM captures')
+        return rows[0][0] if rows else 0
+    
+    def page(self, before_id=None, limit=PAGE_SIZE):
+        """Newest captures first, as dicts; pass the last id to get the next page
+        
+        Paging by id stays on the primary key, so deep pages cost the same
+        as the first one.
+        """
+        columns = ('id', 'path', 'kind', 'created', 'size', 'width', 'height',
+                   'monitor', 'region', 'format', 'duration')
+        sql = f'SELECT {", ".join(columns)} FROM captures'
+        params = ()
+        if before_id is not None:
+            sql += ' WHERE id < ?'
+            params = (before_id,)
+        sql += ' ORDER BY id DESC LIMIT ?'
+        rows = self._execute(sql, params + (limit,))
+        return [dict(zip(columns, row)) for row in rows]
+
+
+class ThumbnailCache:
+    """PNG thumbnails of captures on disk, evicted least recently used
+    
+    Thumbnails are named after the capture's path, size and mtime, so a
+    changed file gets a new one. A hit touches the thumbnail's mtime; the
+    eviction order is rebuilt from mtimes on startup.
+    """
+    
+    SIZE = 128
+    MAX_BYTES = 64 * 1024 * 1024
+    # Longest wait for the first frame of a video
+    DECODE_TIMEOUT_SECONDS = 5
+    
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.lock = threading.Lock()
+        # name -> size, least recently used first; loaded on first use
+        self.entries = None
+        self.bytes = 0
+    
+    def _load(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        found = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.png'):
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name, stat.st_size))
+        self.entries = collections.OrderedDict(
+            (name, size) for mtime, name, size in sorted(found))
+        self.bytes = sum(self.entries.values())
+    
+    def lookup(self, path):
+        """Return the thumbnail path for a capture, creating it if needed
+        
+        Runs on a worker thread. Raises OSError if the capture is gone.
+        """
+        stat = os.stat(path)
+        key = f'{os.path.abspath(path)}\0{stat.st_size}\0{stat.st_mtime_ns}'
+        name = hashlib.sha1(key.encode()).hexdigest() + '.png'
+        thumbnail_path = self.cache_dir / name
+        
+        with self.lock:
+            if self.entries is None:
+                self._load()
+            if name in self.entries:
+                self.entries.move_to_end(name)
+                try:
+                    os.utime(thumbnail_path)
+                    return str(thumbnail_path)
+                except FileNotFoundError:
+                    self.bytes -= self.entries.pop(name)
+        
+        pixbuf = self._render(path)
+        temp_path = self.cache_dir / f'.{name}.{threading.get_ident()}.part'
+        pixbuf.savev(str(temp_path), 'png', [], [])
+        os.replace(temp_path, thumbnail_path)
+        size = os.path.getsize(thumbnail_path)
+        
+        with self.lock:
+            self.bytes += size - self.entries.pop(name, 0)
+            self.entries[name] = size
+            while self.bytes > self.MAX_BYTES and len(self.entries) > 1:
+                old_name, old_size = self.entries.popitem(last=False)
+                self.bytes -= old_size
+                try:
+                    os.remove(self.cache_dir / old_name)
+                except OSError:
+                    pass
+        return str(thumbnail_path)
+    
+    def _render(self, path):
+        """Scaled-down pixbuf of an image or of a video's first frame"""
+        try:
+            return GdkPixbuf.Pixbuf.new_from_file_at_scale(path, self.SIZE, self.SIZE, True)
+        except GLib.Error:
+            pass
+        
+        pipeline = Gst.parse_launch(
+            'filesrc name=src ! decodebin ! videoconvert ! videoscale '
+            '! video/x-raw,format=RGBA,pixel-aspect-ratio=1/1 '
+            '! appsink name=sink sync=false')
+        pipeline.get_by_name('src').set_property('location', path)
+        try:
+            # Broken or partial files must not hold a pool worker forever
+            if pipeline.set_state(Gst.State.PAUSED) == Gst.StateChangeReturn.FAILURE:
+                raise OSError(f"Cannot decode {path}")
+            result, state, pending = pipeline.get_state(self.DECODE_TIMEOUT_SECONDS * Gst.SECOND)
+            if result == Gst.StateChangeReturn.FAILURE:
+                raise OSError(f"Cannot decode {path}")
+            sample = pipeline.get_by_name('sink').emit(
+                'try-pull-preroll', self.DECODE_TIMEOUT_SECONDS * Gst.SECOND)
+            if sample is None:
+                raise OSError(f"No video frame in {path}")
+            structure = sample.get_caps().get_structure(0)
+            width, height = structure.get_value('width'), structure.get_value('height')
+            buffer = sample.get_buffer()
+            frame = CapturedFrame(buffer.extract_dup(0, buffer.get_size()),
+                                  width, height, width * 4)
+        finally:
+            pipeline.set_state(Gst.State.NULL)
+        
+        scale = min(self.SIZE / width, self.SIZE / height, 1)
+        return frame.to_pixbuf().scale_simple(
+            max(1, int(width * scale)), max(1, int(height * scale)),
+            GdkPixbuf.InterpType.BILINEAR)
+
+
+class DuplicateIndex:
+    """Persistent index of saved screenshots by pixel content
+    
+    The exact fingerprint is a BLAKE2 digest of the cropped pixels, size
+    and format, looked up by primary key. The optional perceptual hash is
+    a 64-bit difference hash stored with its eight bytes as bands: two
+    hashes at most PERCEPTUAL_MAX_DISTANCE bits apart share a band, so only
+    captures sharing one are compared. Each entry keeps the file's size,
+    mtime and inode; a file changed or replaced since is no match.
+    """
+    
+    PERCEPTUAL_MAX_DISTANCE = 7
+    BANDS = 8
+    # Bumped when the tables change; an older index is dropped and rebuilt
+    # by later saves
+    SCHEMA_VERSION = 2
+    
+    def __init__(self, config):
+        self.path = config.config_dir / 'dedup.sqlite3'
+        self.lock = threading.Lock()
+        # fingerprint -> Event of a save in progress, so parallel workers
+        # saving the same burst frame wait for the first copy
+        self.in_flight = {}
+        try:
+            self.connection = sqlite3.connect(str(self.path), check_same_thread=False)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+            version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+            if version != self.SCHEMA_VERSION:
+                for table in ('exact', 'perceptual', 'perceptual_bands'):
+                    self.connection.execute(f'DROP TABLE IF EXISTS {table}')
+                self.connection.execute(f'PRAGMA user_version = {self.SCHEMA_VERSION}')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS exact ('
+                'fingerprint BLOB PRIMARY KEY, path TEXT NOT NULL, identity TEXT NOT NULL) '
+                'WITHOUT ROWID')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS perceptual ('
+                'id INTEGER PRIMARY KEY, hash TEXT NOT NULL, format TEXT NOT NULL, '
+                'path TEXT NOT NULL, identity TEXT NOT NULL)')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS perceptual_bands ('
+                'band INTEGER NOT NULL, perceptual_id INTEGER NOT NULL)')
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS perceptual_bands_band ON perceptual_bands (band)')
+            self.connection.commit()
+        except sqlite3.Error as e:
+            print(f"Error opening duplicate index: {e}")
+            self.connection = None
+    
+    def _execute(self, statements):
+        """Run (sql, params) pairs in one transaction; returns the last rows"""
+        if self.connection is None:
+            return []
+        try:
+            with self.lock:
+                rows = []
+                for sql, params in statements:
+                    rows = self.connection.execute(sql, params).fetchall()
+                self.connection.commit()
+                return rows
+        except sqlite3.Error as e:
+            print(f"Duplicate index error: {e}")
+            return []
+    
+    @staticmethod
+    def fingerprint(frame, format_key):
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f'{frame.width}x{frame.height}:{format_key}:'.encode())
+        # Cropped frames are tightly packed, so data holds just the pixels
+        digest.update(frame.data)
+        return digest.digest()
+    
+    @staticmethod
+    def perceptual_hash(frame):
+        """64-bit difference hash: brightness gradients of a 9x8 thumbnail"""
+        small = frame.to_pixbuf().scale_simple(9, 8, GdkPixbuf.InterpType.TILES)
+        pixels = small.get_pixels()
+        stride = small.get_rowstride()
+        channels = small.get_n_channels()
+        value = 0
+        for y in range(8):
+            row = [pixels[y * stride + x * channels] * 299 +
+                   pixels[y * stride + x * channels + 1] * 587 +
+                   pixels[y * stride + x * channels + 2] * 114
+                   for x in range(9)]
+            for x in range(8):
+                value = (value << 1) | (row[x] > row[x + 1])
+        return value
+    
+    @classmethod
+    def get_bands(cls, perceptual_hash):
+        """Band keys of a hash: (band index, byte value) packed in one integer"""
+        return [band * 256 + ((perceptual_hash >> (8 * band)) & 0xff)
+                for band in range(cls.BANDS)]
+    
+    def find(self, frame, format_key, threshold=None):
+        """Look up a screenshot saved earlier with the same content
+        
+        threshold is the perceptual match distance in bits, or None for
+        exact matches only. Returns (path or None, keys). On a miss the
+        fingerprint is claimed until release(keys); pass keys to add()
+        once the new file is written.
+        """
+        fingerprint = self.fingerprint(frame, format_key)
+        perceptual_hash = None
+        if threshold is not None:
+            perceptual_hash = self.perceptual_hash(frame)
+        
+        while True:
+            with self.lock:
+                pending = self.in_flight.get(fingerprint)
+                if pending is None:
+                    claim = threading.Event()
+                    self.in_flight[fingerprint] = claim
+                    break
+            pending.wait()
+        keys = (fingerprint, perceptual_hash, format_key, claim)
+        
+        rows = self._execute([('SELECT path, identity FROM exact WHERE fingerprint = ?',
+                               (fingerprint,))])
+        candidates = [(path, identity, 0) for path, identity in rows]
+        if perceptual_hash is not None:
+            bands = self.get_bands(perceptual_hash)
+            rows = self._execute([(
+                'SELECT DISTINCT perceptual.hash, perceptual.path, perceptual.identity '
+                'FROM perceptual_bands '
+                'JOIN perceptual ON perceptual.id = perceptual_bands.perceptual_id '
+                f'WHERE perceptual_bands.band IN ({", ".join("?" * self.BANDS)}) '
+                'AND perceptual.format = ?', (*bands, format_key))])
+            candidates += [(path, identity, bin(int(value, 16) ^ perceptual_hash).count('1'))
+                           for value, path, identity in rows]
+        
+        limit = min(threshold or 0, self.PERCEPTUAL_MAX_DISTANCE)
+        for path, identity, distance in sorted(candidates, key=lambda candidate: candidate[2]):
+            if distance > limit:
+                continue
+            if self.file_identity(path) == identity:
+                self.release(keys)
+                return path, None
+            # Deleted, edited or replaced since it was indexed
+            self.forget(path)
+        return None, keys
+    
+    @staticmethod
+    def file_identity(path):
+        """Size, mtime and inode of path as one string, or None if it is gone"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return f'{stat.st_size}:{stat.st_mtime_ns}:{stat.st_ino}'
+    
+    def add(self, keys, path):
+        """Index a newly written screenshot under the keys from find()"""
+        fingerprint, perceptual_hash, format_key, claim = keys
+        path = os.path.abspath(path)
+        identity = self.file_identity(path)
+        if identity is None:
+            return
+        statements = [('INSERT OR REPLACE INTO exact (fingerprint, path, identity) '
+                       'VALUES (?, ?, ?)', (fingerprint, path, identity))]
+        if perceptual_hash is not None:
+            statements.append(('INSERT INTO perceptual (hash, format, path, identity) '
+                                'VALUES (?, ?, ?, ?)',
+                                (f'{perceptual_hash:016x}', format_key, path, identity)))
+            statements += [('INSERT INTO perceptual_bands (band, perceptual_id) '
+                             'SELECT ?, MAX(id) FROM perceptual WHERE path = ?', (band, path))
+                           for band in self.get_bands(perceptual_hash)]
+        self._execute(statements)
+    
+    def release(self, keys):
+        """Let other saves of the same content go ahead"""
+        if keys is None:
+            return
+        fingerprint, claim = keys[0], keys[3]
+        with self.lock:
+            if self.in_flight.get(fingerprint) is claim:
+                del self.in_flight[fingerprint]
+        claim.set()
+    
+    def forget(self, path):
+        """Drop a capture that no longer exists or has changed"""
+        self._execute([
+            ('DELETE FROM exact WHERE path = ?', (path,)),
+            ('DELETE FROM perceptual_bands WHERE perceptual_id IN '
+             '(SELECT id FROM perceptual WHERE path = ?)', (path,)),
+            ('DELETE FROM perceptual WHERE path = ?', (path,)),
+        ])
+
+
 class SettingsWindow(Adw.ApplicationWindow):
     """Main settings window for SimpleShot"""
     
@@ -62,13 +1079,17 @@ class SettingsWindow(Adw.ApplicationWindow):
         super().__init__(application=app)
         self.config = config
         self.set_title("SimpleShot")
-        self.set_default_size(500, 400)
+        self.set_default_size(500, 640)
         
         # Create main box
         main_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=0)
         
         # Header bar
         header = Adw.HeaderBar()
+        history_button = Gtk.Button.new_from_icon_name("document-open-recent-symbolic")
+        history_button.set_tooltip_text("Capture History")
+        history_button.connect("clicked", self.on_show_history)
+        header.pack_start(history_button)
         main_box.append(header)
         
         # Content
@@ -113,8 +1134,226 @@ class SettingsWindow(Adw.ApplicationWindow):
         settings_group.add(video_row)
         self.video_row = video_row
         
+        # Save-to-disk row
+        save_row = Adw.SwitchRow()
+        save_row.set_title("Save Screenshots to Disk")
+        save_row.set_subtitle("When off, screenshots are only copied to the clipboard")
+        save_row.set_active(self.config.save_screenshots)
+        save_row.connect("notify::active", self.on_save_screenshots_toggled)
+        settings_group.add(save_row)
+        self.save_row = save_row
+        
+        # fsync row
+        fsync_row = Adw.SwitchRow()
+        fsync_row.set_title("Flush Screenshots to Disk")
+        fsync_row.set_subtitle("Safer on power loss, slower on network home directories")
+        fsync_row.set_active(self.config.fsync_screenshots)
+        fsync_row.connect("notify::active", self.on_fsync_toggled)
+        settings_group.add(fsync_row)
+        self.fsync_row = fsync_row
+        
+        # Duplicate screenshot rows
+        self.dedup_mode_keys = list(DEDUP_MODES)
+        dedup_row = Adw.ComboRow()
+        dedup_row.set_title("Duplicate Screenshots")
+        dedup_row.set_subtitle("Screenshots with the same content as an earlier one")
+        dedup_row.set_model(Gtk.StringList.new(list(DEDUP_MODES.values())))
+        dedup_row.set_selected(self.dedup_mode_keys.index(self.config.dedup_mode))
+        dedup_row.connect("notify::selected", self.on_dedup_mode_selected)
+        settings_group.add(dedup_row)
+        
+        perceptual_row = Adw.SwitchRow()
+        perceptual_row.set_title("Match Visually Identical")
+        perceptual_row.set_subtitle("Also treat nearly identical screenshots as duplicates")
+        perceptual_row.set_active(self.config.dedup_perceptual)
+        perceptual_row.connect("notify::active", self.on_dedup_perceptual_toggled)
+        settings_group.add(perceptual_row)
+        self.perceptual_row = perceptual_row
+        
+        threshold_row = Adw.SpinRow.new_with_range(0, DuplicateIndex.PERCEPTUAL_MAX_DISTANCE, 1)
+        threshold_row.set_title("Visual Match Tolerance")
+        threshold_row.set_subtitle("Differing bits of the 64-bit perceptual hash")
+        threshold_row.set_value(self.config.dedup_threshold)
+        threshold_row.connect("notify::value", self.on_dedup_threshold_changed)
+        settings_group.add(threshold_row)
+        self.threshold_row = threshold_row
+        self.update_dedup_rows()
+        
+        # Screenshot format rows
+        self.image_format_keys = [key for key, image_format in IMAGE_FORMATS.items()
+                                  if image_format.is_available()]
+        format_row = Adw.ComboRow()
+        format_row.set_title("Screenshot Format")
+        format_row.set_model(Gtk.StringList.new(
+            [IMAGE_FORMATS[key].label for key in self.image_format_keys]))
+        current_format = get_image_format(self.config.image_format).key
+        if current_format in self.image_format_keys:
+            format_row.set_selected(self.image_format_keys.index(current_format))
+        format_row.connect("notify::selected", self.on_image_format_selected)
+        settings_group.add(format_row)
+        self.format_row = format_row
+        
+        compression_row = Adw.SpinRow.new_with_range(0, 9, 1)
+        compression_row.set_title("PNG Compression")
+        compression_row.set_subtitle("Lower is faster, higher is smaller")
+        compression_row.set_value(self.config.png_compression)
+        compression_row.connect("notify::value", self.on_png_compression_changed)
+        settings_group.add(compression_row)
+        self.compression_row = compression_row
+        
+        quality_row = Adw.SpinRow.new_with_range(1, 100, 1)
+        quality_row.set_title("Image Quality")
+        quality_row.set_subtitle("For lossy formats")
+        quality_row.set_value(self.config.image_quality)
+        quality_row.connect("notify::value", self.on_image_quality_changed)
+        settings_group.add(quality_row)
+        self.quality_row = quality_row
+        self.update_image_format_rows()
+        
+        # Recording encoder row
+        self.encoder_keys = [key for key, backend in ENCODER_BACKENDS.items()
+                             if backend.is_available()]
+        encoder_row = Adw.ComboRow()
+        encoder_row.set_title("Recording Encoder")
+        encoder_row.set_model(Gtk.StringList.new(
+            [ENCODER_BACKENDS[key].label for key in self.encoder_keys]))
+        current_encoder = get_encoder_backend(self.config.encoder).key
+        if current_encoder in self.encoder_keys:
+            encoder_row.set_selected(self.encoder_keys.index(current_encoder))
+        encoder_row.connect("notify::selected", self.on_encoder_selected)
+        settings_group.add(encoder_row)
+        self.encoder_row = encoder_row
+        
+        self.recording_target_keys = list(RECORDING_TARGETS)
+        target_row = Adw.ComboRow()
+        target_row.set_title("Adaptive Recording Quality")
+        target_row.set_subtitle("Change encoder speed and framerate while recording")
+        target_row.set_model(Gtk.StringList.new(list(RECORDING_TARGETS.values())))
+        target_row.set_selected(self.recording_target_keys.index(self.config.recording_target))
+        target_row.connect("notify::selected", self.on_recording_target_selected)
+        settings_group.add(target_row)
+        self.target_row = target_row
+        
+        max_cpu_row = Adw.SpinRow.new_with_range(5, 100, 5)
+        max_cpu_row.set_title("CPU Limit")
+        max_cpu_row.set_subtitle("Percent of all cores SimpleShot may use, for the CPU limit target")
+        max_cpu_row.set_value(self.config.recording_max_cpu)
+        max_cpu_row.set_sensitive(self.config.recording_target == 'cpu')
+        max_cpu_row.connect("notify::value", self.on_recording_max_cpu_changed)
+        settings_group.add(max_cpu_row)
+        self.max_cpu_row = max_cpu_row
+        
+        skip_row = Adw.SwitchRow()
+        skip_row.set_title("Skip Unchanged Frames")
+        skip_row.set_subtitle("Idle screens cost almost nothing; variable framerate output")
+        skip_row.set_active(self.config.skip_unchanged_frames)
+        skip_row.connect("notify::active", self.on_skip_unchanged_frames_toggled)
+        settings_group.add(skip_row)
+        self.skip_row = skip_row
+        
+        segment_row = Adw.SpinRow.new_with_range(0, 300, 5)
+        segment_row.set_title("Crash-Safe Segments")
+        segment_row.set_subtitle("Seconds per segment, joined after recording; 0 writes one file")
+        segment_row.set_value(self.config.segment_seconds)
+        segment_row.connect("notify::value", self.on_segment_seconds_changed)
+        settings_group.add(segment_row)
+        self.segment_row = segment_row
+        
+        # Pre-capture row
+        precapture_row = Adw.SwitchRow()
+        precapture_row.set_title("Freeze Screen While Selecting")
+        precapture_row.set_subtitle("Screenshots are cropped from the frozen frame instantly")
+        precapture_row.set_active(self.config.precapture)
+        precapture_row.connect("notify::active", self.on_precapture_toggled)
+        settings_group.add(precapture_row)
+        self.precapture_row = precapture_row
+        
         content_box.append(settings_group)
         
+        # Burst and interval capture settings
+        sequence_group = Adw.PreferencesGroup()
+        sequence_group.set_title("Burst and Interval Capture")
+        
+        burst_count_row = Adw.SpinRow.new_with_range(2, 500, 1)
+        burst_count_row.set_title("Burst Frames")
+        burst_count_row.set_value(self.config.burst_count)
+        burst_count_row.connect("notify::value", self.on_burst_count_changed)
+        sequence_group.add(burst_count_row)
+        
+        burst_interval_row = Adw.SpinRow.new_with_range(10, 10000, 10)
+        burst_interval_row.set_title("Burst Spacing")
+        burst_interval_row.set_subtitle("Milliseconds between burst frames")
+        burst_interval_row.set_value(self.config.burst_interval_ms)
+        burst_interval_row.connect("notify::value", self.on_burst_interval_changed)
+        sequence_group.add(burst_interval_row)
+        
+        interval_row = Adw.SpinRow.new_with_range(1, 3600, 1)
+        interval_row.set_title("Interval")
+        interval_row.set_subtitle("Seconds between interval captures")
+        interval_row.set_value(self.config.interval_seconds)
+        interval_row.connect("notify::value", self.on_interval_changed)
+        sequence_group.add(interval_row)
+        
+        content_box.append(sequence_group)
+        
+        # Instant replay
+        replay_group = Adw.PreferencesGroup()
+        replay_group.set_title("Instant Replay")
+        
+        replay_row = Adw.SwitchRow()
+        replay_row.set_title("Keep Replay Buffer")
+        replay_row.set_subtitle("Encode the screen in the background so the last seconds can be saved")
+        replay_row.set_active(app.is_replaying())
+        replay_row.connect("notify::active", self.on_replay_toggled)
+        replay_group.add(replay_row)
+        self.replay_row = replay_row
+        
+        replay_seconds_row = Adw.SpinRow.new_with_range(5, 600, 5)
+        replay_seconds_row.set_title("Replay Length")
+        replay_seconds_row.set_subtitle("Seconds kept; applies the next time the buffer starts")
+        replay_seconds_row.set_value(self.config.replay_seconds)
+        replay_seconds_row.connect("notify::value", self.on_replay_seconds_changed)
+        replay_group.add(replay_seconds_row)
+        
+        replay_memory_row = Adw.SpinRow.new_with_range(16, 4096, 16)
+        replay_memory_row.set_title("Replay Memory Limit")
+        replay_memory_row.set_subtitle("Megabytes; older video is dropped first")
+        replay_memory_row.set_value(self.config.replay_max_mb)
+        replay_memory_row.connect("notify::value", self.on_replay_max_mb_changed)
+        replay_group.add(replay_memory_row)
+        
+        save_replay_button = Gtk.Button(label="Save")
+        save_replay_button.set_valign(Gtk.Align.CENTER)
+        save_replay_button.connect("clicked", self.on_save_replay)
+        save_replay_row = Adw.ActionRow()
+        save_replay_row.set_title("Save Replay")
+        save_replay_row.add_suffix(save_replay_button)
+        save_replay_row.set_sensitive(app.is_replaying())
+        replay_group.add(save_replay_row)
+        self.save_replay_row = save_replay_row
+        
+        content_box.append(replay_group)
+        
+        # Diagnostics
+        diagnostics_group = Adw.PreferencesGroup()
+        diagnostics_group.set_title("Diagnostics")
+        
+        timing_row = Adw.SwitchRow()
+        timing_row.set_title("Log Capture Timings")
+        timing_row.set_subtitle("Summarize with simpleshot --timing-summary")
+        timing_row.set_active(self.config.timing_log)
+        timing_row.connect("notify::active", self.on_timing_log_toggled)
+        diagnostics_group.add(timing_row)
+        
+        stats_row = Adw.SwitchRow()
+        stats_row.set_title("Save Recording Stats")
+        stats_row.set_subtitle("Frame, drop and CPU counts next to each recording")
+        stats_row.set_active(self.config.recording_stats)
+        stats_row.connect("notify::active", self.on_recording_stats_toggled)
+        diagnostics_group.add(stats_row)
+        
+        content_box.append(diagnostics_group)
+        
         # Start button
         start_button = Gtk.Button(label="Start Capture")
         start_button.add_css_class("suggested-action")
@@ -130,7 +1369,12 @@ class SettingsWindow(Adw.ApplicationWindow):
         info_label.add_css_class("dim-label")
         content_box.append(info_label)
         
-        main_box.append(content_box)
+        # The settings list is longer than the window on small screens
+        scrolled = Gtk.ScrolledWindow()
+        scrolled.set_vexpand(True)
+        scrolled.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
+        scrolled.set_child(content_box)
+        main_box.append(scrolled)
         self.set_content(main_box)
     
     def on_choose_picture_dir(self, button):
@@ -139,56 +1383,1081 @@ class SettingsWindow(Adw.ApplicationWindow):
         dialog.set_title("Choose Screenshots Location")
         dialog.select_folder(None, None, self.on_picture_dir_selected)
     
-    def on_picture_dir_selected(self, dialog, result):
-        """Handle picture directory selection"""
+    def on_picture_dir_selected(self, dialog, result):
+        """Handle picture directory selection"""
+        try:
+            folder = dialog.select_folder_finish(result)
+            if folder:
+                path = folder.get_path()
+                self.config.picture_dir = path
+                self.picture_row.set_subtitle(path)
+                self.config.save_config()
+        except Exception as e:
+            print(f"Error selecting folder: {e}")
+    
+    def on_choose_video_dir(self, button):
+        """Open directory chooser for videos"""
+        dialog = Gtk.FileDialog()
+        dialog.set_title("Choose Recordings Location")
+        dialog.select_folder(None, None, self.on_video_dir_selected)
+    
+    def on_video_dir_selected(self, dialog, result):
+        """Handle video directory selection"""
+        try:
+            folder = dialog.select_folder_finish(result)
+            if folder:
+                path = folder.get_path()
+                self.config.video_dir = path
+                self.video_row.set_subtitle(path)
+                self.config.save_config()
+        except Exception as e:
+            print(f"Error selecting folder: {e}")
+    
+    def on_save_screenshots_toggled(self, row, param):
+        """Handle save-to-disk toggle"""
+        self.config.save_screenshots = row.get_active()
+        self.config.save_config()
+    
+    def on_fsync_toggled(self, row, param):
+        """Handle fsync toggle"""
+        self.config.fsync_screenshots = row.get_active()
+        self.config.save_config()
+    
+    def update_dedup_rows(self):
+        """Only offer the perceptual options when dedup is on"""
+        enabled = self.config.dedup_mode != 'off'
+        self.perceptual_row.set_sensitive(enabled)
+        self.threshold_row.set_sensitive(enabled and self.config.dedup_perceptual)
+    
+    def on_dedup_mode_selected(self, row, param):
+        """Handle duplicate screenshot mode selection"""
+        index = row.get_selected()
+        if 0 <= index < len(self.dedup_mode_keys):
+            self.config.dedup_mode = self.dedup_mode_keys[index]
+            self.update_dedup_rows()
+            self.config.save_config()
+    
+    def on_dedup_perceptual_toggled(self, row, param):
+        """Handle visual duplicate matching toggle"""
+        self.config.dedup_perceptual = row.get_active()
+        self.update_dedup_rows()
+        self.config.save_config()
+    
+    def on_dedup_threshold_changed(self, row, param):
+        """Handle visual match tolerance change"""
+        self.config.dedup_threshold = int(row.get_value())
+        self.config.save_config()
+    
+    def update_image_format_rows(self):
+        """Only show the options the selected format uses"""
+        image_format = get_image_format(self.config.image_format)
+        self.compression_row.set_visible(image_format.uses_compression)
+        self.quality_row.set_visible(image_format.uses_quality)
+    
+    def on_image_format_selected(self, row, param):
+        """Handle screenshot format selection"""
+        index = row.get_selected()
+        if 0 <= index < len(self.image_format_keys):
+            self.config.image_format = self.image_format_keys[index]
+            self.config.save_config()
+            self.update_image_format_rows()
+    
+    def on_png_compression_changed(self, row, param):
+        """Handle PNG compression level change"""
+        self.config.png_compression = int(row.get_value())
+        self.config.save_config()
+    
+    def on_image_quality_changed(self, row, param):
+        """Handle image quality change"""
+        self.config.image_quality = int(row.get_value())
+        self.config.save_config()
+    
+    def on_encoder_selected(self, row, param):
+        """Handle recording encoder selection"""
+        index = row.get_selected()
+        if 0 <= index < len(self.encoder_keys):
+            self.config.encoder = self.encoder_keys[index]
+            self.config.save_config()
+    
+    def on_recording_target_selected(self, row, param):
+        """Handle adaptive recording target selection"""
+        index = row.get_selected()
+        if 0 <= index < len(self.recording_target_keys):
+            self.config.recording_target = self.recording_target_keys[index]
+            self.max_cpu_row.set_sensitive(self.config.recording_target == 'cpu')
+            self.config.save_config()
+    
+    def on_recording_max_cpu_changed(self, row, param):
+        """Handle CPU limit change"""
+        self.config.recording_max_cpu = int(row.get_value())
+        self.config.save_config()
+    
+    def on_skip_unchanged_frames_toggled(self, row, param):
+        """Handle unchanged frame skipping toggle"""
+        self.config.skip_unchanged_frames = row.get_active()
+        self.config.save_config()
+    
+    def on_segment_seconds_changed(self, row, param):
+        """Handle crash-safe segment length change"""
+        self.config.segment_seconds = int(row.get_value())
+        self.config.save_config()
+    
+    def on_precapture_toggled(self, row, param):
+        """Handle pre-capture toggle"""
+        self.config.precapture = row.get_active()
+        self.config.save_config()
+    
+    def on_burst_count_changed(self, row, param):
+        """Handle burst frame count change"""
+        self.config.burst_count = int(row.get_value())
+        self.config.save_config()
+    
+    def on_burst_interval_changed(self, row, param):
+        """Handle burst spacing change"""
+        self.config.burst_interval_ms = int(row.get_value())
+        self.config.save_config()
+    
+    def on_interval_changed(self, row, param):
+        """Handle interval capture period change"""
+        self.config.interval_seconds = int(row.get_value())
+        self.config.save_config()
+    
+    def on_replay_toggled(self, row, param):
+        """Start or stop the instant replay buffer"""
+        if row.get_active():
+            self.get_application().start_replay(self.on_replay_started)
+        else:
+            self.get_application().stop_replay()
+        self.save_replay_row.set_sensitive(row.get_active())
+    
+    def on_replay_started(self, success, message):
+        """Turn the switch back off if the buffer could not start"""
+        if not success:
+            print(message)
+            self.replay_row.set_active(False)
+    
+    def on_replay_seconds_changed(self, row, param):
+        """Handle replay length change"""
+        self.config.replay_seconds = int(row.get_value())
+        self.config.save_config()
+    
+    def on_replay_max_mb_changed(self, row, param):
+        """Handle replay memory limit change"""
+        self.config.replay_max_mb = int(row.get_value())
+        self.config.save_config()
+    
+    def on_save_replay(self, button):
+        """Save the instant replay buffer"""
+        self.get_application().save_replay('', lambda success, message: None)
+    
+    def on_timing_log_toggled(self, row, param):
+        """Handle timing log toggle"""
+        self.config.timing_log = row.get_active()
+        self.config.save_config()
+    
+    def on_recording_stats_toggled(self, row, param):
+        """Handle recording stats sidecar toggle"""
+        self.config.recording_stats = row.get_active()
+        self.config.save_config()
+    
+    def on_show_history(self, button):
+        """Open the capture history"""
+        app = self.get_application()
+        HistoryWindow(self, app.history, app.thumbnails).present()
+    
+    def on_start_capture(self, button):
+        """Start the capture selection interface"""
+        # Hide first: with a warm session the selection UI (and a frozen
+        # frame) may be set up before start_capture_session returns
+        self.set_visible(False)
+        self.get_application().start_capture_session(self)
+
+
+class HistoryWindow(Adw.Window):
+    """Browses the capture history, newest first, one page at a time"""
+    
+    def __init__(self, parent, history, thumbnails):
+        super().__init__(transient_for=parent)
+        self.history = history
+        self.thumbnails = thumbnails
+        self.last_id = None
+        self.exhausted = False
+        self.set_title("Capture History")
+        self.set_default_size(560, 640)
+        
+        main_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=0)
+        header_bar = Adw.HeaderBar()
+        count = history.count()
+        header_bar.set_title_widget(Adw.WindowTitle.new(
+            "Capture History", f"{count} capture{'s' if count != 1 else ''}"))
+        main_box.append(header_bar)
+        
+        self.list_box = Gtk.ListBox()
+        self.list_box.set_selection_mode(Gtk.SelectionMode.NONE)
+        self.list_box.add_css_class("boxed-list")
+        self.list_box.set_margin_top(20)
+        self.list_box.set_margin_bottom(20)
+        self.list_box.set_margin_start(20)
+        self.list_box.set_margin_end(20)
+        self.list_box.set_valign(Gtk.Align.START)
+        
+        empty_label = Gtk.Label(label="No captures yet")
+        empty_label.add_css_class("dim-label")
+        empty_label.set_margin_top(12)
+        empty_label.set_margin_bottom(12)
+        self.list_box.set_placeholder(empty_label)
+        
+        # Only the next page is read from the index when the end is reached
+        scrolled = Gtk.ScrolledWindow()
+        scrolled.set_vexpand(True)
+        scrolled.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
+        scrolled.set_child(self.list_box)
+        scrolled.connect("edge-reached", self.on_edge_reached)
+        main_box.append(scrolled)
+        self.set_content(main_box)
+        
+        self.load_page()
+    
+    def load_page(self):
+        """Append the next page of captures"""
+        if self.exhausted:
+            return
+        entries = self.history.page(self.last_id)
+        if len(entries) < CaptureHistory.PAGE_SIZE:
+            self.exhausted = True
+        for entry in entries:
+            self.list_box.append(self.create_row(entry))
+            self.last_id = entry['id']
+    
+    def on_edge_reached(self, scrolled, position):
+        if position == Gtk.PositionType.BOTTOM:
+            self.load_page()
+    
+    def create_row(self, entry):
+        """A row with the thumbnail (filled in later) and the capture details"""
+        row = Adw.ActionRow()
+        row.set_title(GLib.markup_escape_text(os.path.basename(entry['path'])))
+        row.set_subtitle(GLib.markup_escape_text(self.describe(entry)))
+        row.set_activatable(True)
+        row.connect("activated", self.on_row_activated, entry['path'])
+        
+        picture = Gtk.Picture()
+        picture.set_size_request(64, 64)
+        picture.set_content_fit(Gtk.ContentFit.CONTAIN)
+        row.add_prefix(picture)
+        
+        run_in_background(self.thumbnails.lookup,
+                          lambda thumbnail, error: self.on_thumbnail(row, picture, entry,
+                                                                     thumbnail, error),
+                          entry['path'])
+        return row
+    
+    @staticmethod
+    def describe(entry):
+        """One-line summary: time, size in pixels, format, length, file size"""
+        parts = [datetime.fromtimestamp(entry['created']).strftime("%Y-%m-%d %H:%M:%S")]
+        if entry['width'] and entry['height']:
+            parts.append(f"{entry['width']}×{entry['height']}")
+        if entry['format']:
+            parts.append(entry['format'].upper())
+        if entry['duration']:
+            parts.append(f"{entry['duration']:.0f} s")
+        if entry['size'] is not None:
+            parts.append(f"{entry['size'] / (1024 * 1024):.1f} MB")
+        if entry['monitor']:
+            parts.append(entry['monitor'])
+        return " · ".join(parts)
+    
+    def on_thumbnail(self, row, picture, entry, thumbnail, error):
+        if isinstance(error, FileNotFoundError):
+            # Deleted outside SimpleShot: forget it
+            self.history.remove(entry['path'])
+            if row.get_parent() is self.list_box:
+                self.list_box.remove(row)
+        elif error:
+            print(f"Error creating thumbnail for {entry['path']}: {error}")
+        else:
+            picture.set_filename(thumbnail)
+    
+    def on_row_activated(self, row, path):
+        """Open the capture in the default application"""
+        launcher = Gtk.FileLauncher.new(Gio.File.new_for_path(path))
+        launcher.launch(self, None, None)
+
+
+class CapturedFrame:
+    """A single RGBA frame pulled from a ScreenCast stream"""
+    
+    def __init__(self, data, width, height, stride):
+        self.data = data
+        self.width = width
+        self.height = height
+        self.stride = stride
+    
+    @classmethod
+    def from_sample(cls, sample):
+        """Build a frame from an RGBA sample"""
+        structure = sample.get_caps().get_structure(0)
+        width = structure.get_value('width')
+        height = structure.get_value('height')
+        buffer = sample.get_buffer()
+        data = buffer.extract_dup(0, buffer.get_size())
+        # RGBA rows are always 4-byte aligned, so GStreamer adds no padding
+        return cls(data, width, height, width * 4)
+    
+    def crop(self, x, y, width, height):
+        """Return a frame holding only the given rectangle"""
+        if (x, y, width, height) == (0, 0, self.width, self.height):
+            return self
+        view = memoryview(self.data)
+        row_bytes = width * 4
+        start = y * self.stride + x * 4
+        rows = [view[start + row * self.stride:start + row * self.stride + row_bytes]
+                for row in range(height)]
+        return CapturedFrame(b''.join(rows), width, height, row_bytes)
+    
+    def to_texture(self):
+        """Build a Gdk.MemoryTexture (the data is copied once into GLib.Bytes)"""
+        return Gdk.MemoryTexture.new(
+            self.width,
+            self.height,
+            Gdk.MemoryFormat.R8G8B8A8,
+            GLib.Bytes.new(self.data),
+            self.stride
+        )
+    
+    def to_pixbuf(self):
+        """Build a GdkPixbuf (the data is copied once into GLib.Bytes)"""
+        return GdkPixbuf.Pixbuf.new_from_bytes(
+            GLib.Bytes.new(self.data),
+            GdkPixbuf.Colorspace.RGB,
+            True,
+            8,
+            self.width,
+            self.height,
+            self.stride
+        )
+
+
+class FrameGrabber:
+    """Persistent in-process pipeline that keeps the latest frame of a stream"""
+    
+    # Frames to let through after a request before one is handed out, so
+    # the compositor has repainted without our overlay windows
+    SETTLE_FRAMES = 2
+    # If the screen is idle PipeWire sends no new frames; fall back to the
+    # most recent one after this many milliseconds
+    SETTLE_TIMEOUT_MS = 250
+    # A newly started stream can take a while to send its first frame
+    FIRST_FRAME_TIMEOUT_MS = 3000
+    # Longest a frame conversion may take
+    CONVERT_TIMEOUT = 5 * Gst.SECOND
+    
+    def __init__(self, node_id, pipewire_fd):
+        self.node_id = node_id
+        self.pipewire_fd = pipewire_fd
+        self.pipeline = None
+        self.sink = None
+        self.latest_sample = None
+        self.frame_serial = 0
+        self.waiters = []
+        self.lock = threading.Lock()
+    
+    def start(self):
+        """Build the pipeline and start buffering frames"""
+        try:
+            self.pipeline = Gst.parse_launch(
+                # Frames are kept in whatever format PipeWire sends and
+                # only the one handed out is converted to RGBA
+                pipewire_source_description(self.pipewire_fd, self.node_id, 'always-copy=true') +
+                '! video/x-raw '
+                '! appsink name=sink emit-signals=true max-buffers=1 drop=true sync=false'
+            )
+            self.sink = self.pipeline.get_by_name('sink')
+            self.sink.connect('new-sample', self._on_new_sample)
+            
+            if self.pipeline.set_state(Gst.State.PLAYING) == Gst.StateChangeReturn.FAILURE:
+                print("Failed to start frame grabber pipeline")
+                self.stop()
+                return False
+            
+            print(f"Frame grabber attached to PipeWire node {self.node_id}")
+            return True
+            
+        except GLib.Error as e:
+            print(f"Error creating frame grabber: {e}")
+            self.pipeline = None
+            return False
+    
+    def stop(self):
+        """Tear down the pipeline"""
+        if self.pipeline:
+            self.pipeline.set_state(Gst.State.NULL)
+        self.pipeline = None
+        self.sink = None
+        with self.lock:
+            self.latest_sample = None
+            self.waiters = []
+    
+    def _on_new_sample(self, sink):
+        """Store the newest sample (runs on the streaming thread)"""
+        sample = sink.emit('pull-sample')
+        if sample is None:
+            return Gst.FlowReturn.ERROR
+        
+        ready = []
+        with self.lock:
+            self.latest_sample = sample
+            self.frame_serial += 1
+            pending = []
+            for target, callback in self.waiters:
+                if self.frame_serial >= target:
+                    ready.append(callback)
+                else:
+                    pending.append((target, callback))
+            self.waiters = pending
+        
+        for callback in ready:
+            self._deliver(callback, sample)
+        return Gst.FlowReturn.OK
+    
+    @classmethod
+    def _convert(cls, sample):
+        """Convert a raw sample to an RGBA frame (runs on the worker pool)"""
+        if sample is None:
+            return None
+        caps = Gst.Caps.from_string('video/x-raw,format=RGBA')
+        return CapturedFrame.from_sample(
+            GstVideo.video_convert_sample(sample, caps, cls.CONVERT_TIMEOUT))
+    
+    def _deliver(self, callback, sample):
+        """Convert a sample into a frame off the main loop and hand it to callback"""
+        def on_frame_ready(frame, error):
+            if error:
+                print(f"Error reading frame: {error}")
+            callback(frame)
+        
+        run_in_background(self._convert, on_frame_ready, sample)
+    
+    def _on_settle_timeout(self, callback):
+        """Deliver the latest frame if the stream stayed idle"""
+        with self.lock:
+            waiting = [w for w in self.waiters if w[1] is callback]
+            if not waiting:
+                return False
+            self.waiters = [w for w in self.waiters if w[1] is not callback]
+            sample = self.latest_sample
+        self._deliver(callback, sample)
+        return False
+    
+    def get_frame_size(self):
+        """Return (width, height) of the most recent frame, or None"""
+        with self.lock:
+            sample = self.latest_sample
+        if sample is None:
+            return None
+        structure = sample.get_caps().get_structure(0)
+        return structure.get_value('width'), structure.get_value('height')
+    
+    def grab_frame(self, callback, settle=True):
+        """Request a frame; callback(frame or None) runs on the main loop
+        
+        With settle=False the most recent frame is returned straight away.
+        If no frame has arrived yet, the first one is returned, waiting up
+        to FIRST_FRAME_TIMEOUT_MS for it.
+        """
+        if not self.pipeline:
+            callback(None)
+            return
+        
+        with self.lock:
+            sample = self.latest_sample
+            if not settle and sample is not None:
+                self._deliver(callback, sample)
+                return
+            if sample is None:
+                # Nothing to fall back to: wait for the first frame
+                frames_to_wait = 1
+                timeout = self.FIRST_FRAME_TIMEOUT_MS
+            else:
+                frames_to_wait = self.SETTLE_FRAMES if settle else 1
+                timeout = self.SETTLE_TIMEOUT_MS
+            self.waiters.append((self.frame_serial + frames_to_wait, callback))
+        GLib.timeout_add(timeout, self._on_settle_timeout, callback)
+
+
+class ScreenCastStream:
+    """One PipeWire stream of a ScreenCast session (usually one monitor)"""
+    
+    def __init__(self, node_id, properties):
+        self.node_id = node_id
+        # Position and size are in compositor (logical) coordinates; the
+        # portal omits position for window sources
+        self.position = properties.get('position')
+        self.size = properties.get('size')
+        self.frame_grabber = None
+    
+    def get_origin(self):
+        """Top-left corner of the stream in compositor coordinates"""
+        return self.position if self.position else (0, 0)
+    
+    def get_scale(self, frame_width, fallback=1):
+        """Physical pixels per logical pixel, from the frame and stream widths
+        
+        Unlike the monitor's integer scale factor this is right for
+        fractional scaling too.
+        """
+        if self.size and self.size[0]:
+            return frame_width / self.size[0]
+        return fallback
+    
+    def contains_monitor(self, monitor):
+        """Whether the stream covers all of the given monitor"""
+        if not self.position or not self.size:
+            return False
+        geometry = monitor.get_geometry()
+        return (self.position[0] <= geometry.x and self.position[1] <= geometry.y and
+                geometry.x + geometry.width <= self.position[0] + self.size[0] and
+                geometry.y + geometry.height <= self.position[1] + self.size[1])
+    
+    def matches_monitor(self, monitor):
+        """Whether this stream shows exactly the given monitor"""
+        geometry = monitor.get_geometry()
+        return (self.position == (geometry.x, geometry.y) and
+                self.size == (geometry.width, geometry.height))
+    
+    def describe(self):
+        """Connector of the monitor this stream shows, else its geometry"""
+        display = Gdk.Display.get_default()
+        if display:
+            monitors = display.get_monitors()
+            for i in range(monitors.get_n_items()):
+                monitor = monitors.get_item(i)
+                if self.matches_monitor(monitor) and monitor.get_connector():
+                    return monitor.get_connector()
+        if self.position and self.size:
+            return f"{self.size[0]}x{self.size[1]}+{self.position[0]}+{self.position[1]}"
+        return f"node {self.node_id}"
+
+
+class UnchangedFrameFilter:
+    """Drops recording frames identical to the previous one
+    
+    Sits in front of videoconvert, so skipped frames are never converted,
+    and compares a CRC of every ROW_STEP-th row of the mapped frame with
+    the last one let through. Timestamps are kept, so the recording gets a
+    variable framerate and an idle screen costs almost nothing to convert,
+    encode or store. A repeat still goes through every MAX_IDLE_SECONDS so
+    players keep advancing; that also brings in changes that fell between
+    the sampled rows.
+    """
+    
+    MAX_IDLE_SECONDS = 1
+    ROW_STEP = 4
+    
+    def __init__(self, pad):
+        self.last_checksum = None
+        self.last_pts = None
+        # Only written by the streaming thread
+        self.skipped = 0
+        pad.add_probe(Gst.PadProbeType.BUFFER, self._on_buffer)
+    
+    def _on_buffer(self, pad, info):
+        buffer = info.get_buffer()
+        checksum = self._checksum(pad, buffer)
+        pts = buffer.pts
+        if (checksum is not None and checksum == self.last_checksum and
+                pts != Gst.CLOCK_TIME_NONE and self.last_pts is not None and
+                pts - self.last_pts < self.MAX_IDLE_SECONDS * Gst.SECOND):
+            self.skipped += 1
+            return Gst.PadProbeReturn.DROP
+        
+        self.last_checksum = checksum
+        self.last_pts = pts
+        return Gst.PadProbeReturn.OK
+    
+    def _checksum(self, pad, buffer):
+        """CRC of every ROW_STEP-th row, read in place"""
+        caps = pad.get_current_caps()
+        height = caps.get_structure(0).get_value('height') if caps else 0
+        success, map_info = buffer.map(Gst.MapFlags.READ)
+        if not success:
+            return None
+        try:
+            data = memoryview(map_info.data)
+            # Screen formats are single-plane, so size / height is the stride
+            stride = len(data) // height if height else len(data)
+            checksum = 0
+            for offset in range(0, len(data) - stride + 1, stride * self.ROW_STEP):
+                checksum = zlib.crc32(data[offset:offset + stride], checksum)
+            return checksum
+        finally:
+            buffer.unmap(map_info)
+
+
+class RecordingStats:
+    """Live frame, byte and CPU counters for a recording pipeline
+    
+    Pad probes count frames entering the pipeline (captured), frames
+    leaving the encoder (encoded) and bytes reaching the filesink; once a
+    second a sample is taken on the main loop. Frames the leaky encoder
+    queue throws away show up as captured but never encoded; frames an
+    UnchangedFrameFilter skipped are counted separately.
+    """
+    
+    SAMPLE_INTERVAL_SECONDS = 1
+    # Seconds in a row with new drops before drops_callback fires
+    DROP_ALERT_SECONDS = 3
+    
+    def __init__(self, pipeline, encoder_key, controller=None, frame_filter=None):
+        self.pipeline = pipeline
+        self.encoder_key = encoder_key
+        self.controller = controller
+        self.frame_filter = frame_filter
+        self.queue = pipeline.get_by_name('encodequeue')
+        # Each counter is only written by one streaming thread
+        self.captured = 0
+        self.encoded = 0
+        self.bytes_written = 0
+        self.samples = []
+        self.max_queue_depth = 0
+        self.drop_streak = 0
+        self.dropping = False
+        self.started = None
+        self.cpu_started = None
+        self.timeout_id = 0
+        # update_callback(stats) after every sample, drops_callback(stats)
+        # once when drops have lasted DROP_ALERT_SECONDS
+        self.update_callback = None
+        self.drops_callback = None
+        
+        pipeline.get_by_name('crop').get_static_pad('sink').add_probe(
+            Gst.PadProbeType.BUFFER, self._on_captured)
+        pipeline.get_by_name('encoder').get_static_pad('src').add_probe(
+            Gst.PadProbeType.BUFFER, self._on_encoded)
+        # Segmented recordings have their filesinks inside splitmuxsink;
+        # count encoded bytes instead
+        filesink = pipeline.get_by_name('filesink') or pipeline.get_by_name('encoder')
+        pad = filesink.get_static_pad('sink' if filesink.get_name() == 'filesink' else 'src')
+        pad.add_probe(Gst.PadProbeType.BUFFER, self._on_written)
+    
+    def _on_captured(self, pad, info):
+        self.captured += 1
+        return Gst.PadProbeReturn.OK
+    
+    def _on_encoded(self, pad, info):
+        self.encoded += 1
+        return Gst.PadProbeReturn.OK
+    
+    def _on_written(self, pad, info):
+        # Muxers seek back to rewrite headers, so this can slightly
+        # overstate the final file size
+        self.bytes_written += info.get_buffer().get_size()
+        return Gst.PadProbeReturn.OK
+    
+    def start(self):
+        """Start sampling"""
+        self.started = time.monotonic()
+        self.cpu_started = time.process_time()
+        self.timeout_id = GLib.timeout_add_seconds(self.SAMPLE_INTERVAL_SECONDS, self._on_sample)
+    
+    def stop(self):
+        """Take a final sample and stop sampling"""
+        if self.timeout_id:
+            GLib.source_remove(self.timeout_id)
+            self.timeout_id = 0
+            self.sample()
+    
+    def get_queue_depth(self):
+        if not self.queue:
+            return 0
+        return self.queue.get_property('current-level-buffers')
+    
+    def get_skipped(self):
+        return self.frame_filter.skipped if self.frame_filter else 0
+    
+    def get_dropped(self):
+        """Frames captured but neither encoded, skipped nor still waiting"""
+        return max(0, self.captured - self.encoded - self.get_skipped() - self.get_queue_depth())
+    
+    def sample(self):
+        """Record the current counters and return the sample"""
+        elapsed = time.monotonic() - self.started
+        queue_depth = self.get_queue_depth()
+        previous = self.samples[-1] if self.samples else None
+        
+        if previous:
+            interval = elapsed - previous['elapsed']
+            fps = (self.encoded - previous['encoded']) / interval if interval > 0 else 0
+            new_drops = self.get_dropped() - previous['dropped']
+        else:
+            fps = self.encoded / elapsed if elapsed > 0 else 0
+            new_drops = self.get_dropped()
+        cpu_seconds = time.process_time() - self.cpu_started
+        
+        sample = {
+            'elapsed': round(elapsed, 3),
+            'captured': self.captured,
+            'encoded': self.encoded,
+            'skipped': self.get_skipped(),
+            'dropped': self.get_dropped(),
+            'fps': round(fps, 2),
+            'queue_depth': queue_depth,
+            'bytes': self.bytes_written,
+            'cpu_seconds': round(cpu_seconds, 3),
+            'cpu_percent': round(cpu_seconds / elapsed * 100, 1) if elapsed > 0 else 0,
+        }
+        self.samples.append(sample)
+        self.max_queue_depth = max(self.max_queue_depth, queue_depth)
+        self.drop_streak = self.drop_streak + 1 if new_drops > 0 else 0
+        return sample
+    
+    def _on_sample(self):
+        self.sample()
+        if self.controller:
+            self.controller.update(self)
+        if self.update_callback:
+            self.update_callback(self)
+        if self.drop_streak >= self.DROP_ALERT_SECONDS and not self.dropping:
+            self.dropping = True
+            if self.drops_callback:
+                self.drops_callback(self)
+        return True
+    
+    def get_latest(self):
+        """Most recent sample, or None before the first one"""
+        return self.samples[-1] if self.samples else None
+    
+    def format_lines(self):
+        """Short text lines describing the latest sample"""
+        sample = self.get_latest()
+        if not sample:
+            return ["Starting..."]
+        minutes, seconds = divmod(int(sample['elapsed']), 60)
+        return [
+            f"REC {minutes:02d}:{seconds:02d}   {sample['fps']:.1f} fps   {self.encoder_key}",
+            f"Frames {sample['captured']} captured, {sample['encoded']} encoded, "
+            f"{sample['skipped']} unchanged, {sample['dropped']} dropped",
+            f"Queue {sample['queue_depth']}   {sample['bytes'] / 1e6:.1f} MB   "
+            f"CPU {sample['cpu_percent']:.0f}%",
+        ] + ([f"Adaptive: {self.controller.describe_level()}"] if self.controller else [])
+    
+    def get_summary(self):
+        """Whole-recording totals plus the per-second samples"""
+        last = self.get_latest() or {}
+        elapsed = last.get('elapsed', 0)
+        return {
+            'encoder': self.encoder_key,
+            'duration': elapsed,
+            'captured_frames': last.get('captured', 0),
+            'encoded_frames': last.get('encoded', 0),
+            'skipped_frames': last.get('skipped', 0),
+            'dropped_frames': last.get('dropped', 0),
+            'average_fps': round(last.get('encoded', 0) / elapsed, 2) if elapsed else 0,
+            'max_queue_depth': self.max_queue_depth,
+            'bytes': last.get('bytes', 0),
+            'cpu_seconds': last.get('cpu_seconds', 0),
+            'adaptive': self.controller.get_summary() if self.controller else None,
+            'samples': self.samples,
+        }
+    
+    def write_sidecar(self, recording_path):
+        """Write the summary next to the recording as <name>.stats.json"""
+        path = os.path.splitext(recording_path)[0] + '.stats.json'
+        summary = dict(self.get_summary(), recording=os.path.basename(recording_path))
+        with open(path, 'w') as f:
+            json.dump(summary, f, indent=2)
+        return path
+
+
+class AdaptiveQualityController:
+    """Steps encoder speed and the framerate cap of a running recording
+    
+    Levels run from the best quality the backend offers to its fastest
+    speed preset followed by lower framerate caps. Each stats sample is
+    judged against the target: under pressure the controller moves one
+    level towards speed, and after a calm stretch one level back towards
+    quality. Moving back is slowed down every time it has to be undone.
+    
+    CPU use is that of the whole SimpleShot process, not just the encoder:
+    GStreamer threads can't be told apart, and capture, conversion and
+    any replay buffer also count against the limit.
+    """
+    
+    # Framerate caps tried once the encoder is at its fastest (0 = none)
+    FRAMERATE_CAPS = (0, 30, 24, 15)
+    # Queue depth (buffers) that counts as the encoder falling behind
+    QUEUE_HIGH = 4
+    # In CPU mode, step back towards quality below this share of the limit
+    CPU_HEADROOM = 0.7
+    # Samples to wait after a change before judging its effect
+    SETTLE_SAMPLES = 2
+    # Calm samples needed before stepping back towards quality; doubles
+    # (up to the maximum) whenever a step back had to be undone
+    RECOVER_SAMPLES = 5
+    MAX_RECOVER_SAMPLES = 60
+    
+    def __init__(self, pipeline, backend, target, max_cpu_percent):
+        self.target = target
+        self.max_cpu_percent = max_cpu_percent
+        self.encoder = pipeline.get_by_name('encoder')
+        self.rate = pipeline.get_by_name('rate')
+        self.speed_property = backend.speed_property
+        speeds = list(backend.speed_levels) if backend.speed_property else [None]
+        
+        self.levels = [(speed, 0) for speed in speeds]
+        self.levels += [(speeds[-1], cap) for cap in self.FRAMERATE_CAPS[1:]]
+        # Start from the configured encoder settings
+        self.level = 0
+        if self.speed_property:
+            current = self.encoder.get_property(self.speed_property)
+            self.level = min(range(len(speeds)), key=lambda i: abs(speeds[i] - current))
+        
+        self.wait = self.SETTLE_SAMPLES
+        self.calm = 0
+        self.recover_samples = self.RECOVER_SAMPLES
+        self.last_step_back = False
+        self.changes = []
+    
+    def describe_level(self):
+        speed, cap = self.levels[self.level]
+        parts = []
+        if self.speed_property:
+            parts.append(f"{self.speed_property} {speed}")
+        parts.append(f"max {cap} fps" if cap else "full fps")
+        return ", ".join(parts)
+    
+    def update(self, stats):
+        """Judge the latest sample and change level if needed"""
+        if len(stats.samples) < 2:
+            return
+        previous, sample = stats.samples[-2], stats.samples[-1]
+        interval = sample['elapsed'] - previous['elapsed']
+        if interval <= 0:
+            return
+        cpu_percent = ((sample['cpu_seconds'] - previous['cpu_seconds']) / interval * 100 /
+                       (os.cpu_count() or 1))
+        dropped = sample['dropped'] > previous['dropped']
+        
+        if self.target == 'cpu':
+            pressure = cpu_percent > self.max_cpu_percent
+            calm = cpu_percent < self.max_cpu_percent * self.CPU_HEADROOM
+        else:
+            pressure = dropped or sample['queue_depth'] >= self.QUEUE_HIGH
+            calm = not dropped and sample['queue_depth'] <= 1
+        
+        if self.wait > 0:
+            self.wait -= 1
+            return
+        
+        if pressure and self.level < len(self.levels) - 1:
+            if self.last_step_back:
+                self.recover_samples = min(self.recover_samples * 2, self.MAX_RECOVER_SAMPLES)
+            self._set_level(self.level + 1, stats, sample, cpu_percent, step_back=False)
+        elif pressure:
+            self.calm = 0
+        elif calm:
+            self.calm += 1
+            if self.calm >= self.recover_samples and self.level > 0:
+                self._set_level(self.level - 1, stats, sample, cpu_percent, step_back=True)
+        else:
+            self.calm = 0
+    
+    def _set_level(self, level, stats, sample, cpu_percent, step_back):
+        speed, cap = self.levels[level]
+        if self.speed_property:
+            self.encoder.set_property(self.speed_property, speed)
+        if self.rate:
+            # videorate treats max-rate as "no cap" at its maximum
+            self.rate.set_property('max-rate', cap or 2 ** 31 - 1)
+        
+        self.level = level
+        self.wait = self.SETTLE_SAMPLES
+        self.calm = 0
+        self.last_step_back = step_back
+        self.changes.append({
+            'elapsed': sample['elapsed'],
+            'level': self.describe_level(),
+            'queue_depth': sample['queue_depth'],
+            'dropped': sample['dropped'],
+            'cpu_percent': round(cpu_percent, 1),
+        })
+        print(f"Recording quality: {self.describe_level()}")
+    
+    def get_summary(self):
+        return {
+            'target': self.target,
+            'max_cpu_percent': self.max_cpu_percent if self.target == 'cpu' else None,
+            'final_level': self.describe_level(),
+            'changes': self.changes,
+        }
+
+
+class RecordingSegments:
+    """Rolling segment files for one recording, joined when it ends
+    
+    While recording, splitmuxsink closes a complete, playable file every
+    few seconds in a hidden .<name>.parts directory next to the recording.
+    Afterwards the parts are remuxed (not re-encoded) into the recording in
+    the background. If SimpleShot dies first, recover() joins what is left
+    on the next start, losing at most the segment that was being written.
+    """
+    
+    PARTS_SUFFIX = '.parts'
+    
+    def __init__(self, app, filepath):
+        self.app = app
+        self.filepath = filepath
+        directory, name = os.path.split(filepath)
+        self.parts_dir = os.path.join(directory, f'.{name}{self.PARTS_SUFFIX}')
+        self.extension = os.path.splitext(filepath)[1].lstrip('.')
+    
+    def get_location(self):
+        """splitmuxsink location pattern"""
+        return os.path.join(self.parts_dir, f'part%05d.{self.extension}')
+    
+    def get_parts(self):
+        try:
+            names = sorted(os.listdir(self.parts_dir))
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.parts_dir, name) for name in names
+                if name.startswith('part') and name.endswith(f'.{self.extension}')]
+    
+    def get_muxer(self):
+        """Muxer factory for this recording's container"""
+        for backend in ENCODER_BACKENDS.values():
+            if backend.extension == self.extension:
+                return backend.muxer.split()[0]
+        return 'matroskamux'
+    
+    def join(self, callback, drop_last_on_error=False):
+        """Remux the parts into the recording; callback(success) on the main loop
+        
+        With drop_last_on_error a failed join is retried without the last
+        part, which may be truncated after a crash.
+        """
+        parts = self.get_parts()
+        if not parts:
+            shutil.rmtree(self.parts_dir, ignore_errors=True)
+            callback(False)
+            return
+        
+        try:
+            pipeline = Gst.parse_launch(
+                'splitmuxsrc name=src src. ! queue '
+                f'! {self.get_muxer()} ! filesink name=filesink')
+        except GLib.Error as e:
+            print(f"Error joining recording segments: {e}")
+            callback(False)
+            return
+        pipeline.get_by_name('src').connect('format-location', lambda src: parts)
+        pipeline.get_by_name('filesink').set_property('location', self.filepath)
+        
+        def on_finished(success):
+            if success:
+                shutil.rmtree(self.parts_dir, ignore_errors=True)
+                callback(True)
+            elif drop_last_on_error and len(parts) > 1:
+                os.remove(parts[-1])
+                self.join(callback)
+            else:
+                callback(False)
+        
+        run_pipeline_to_eos(self.app, pipeline, on_finished)
+    
+    @classmethod
+    def recover(cls, app, video_dir):
+        """Join segments left behind by recordings that never finished"""
         try:
-            folder = dialog.select_folder_finish(result)
-            if folder:
-                path = folder.get_path()
-                self.config.picture_dir = path
-                self.picture_row.set_subtitle(path)
-                self.config.save_config()
-        except Exception as e:
-            print(f"Error selecting folder: {e}")
+            names = os.listdir(video_dir)
+        except OSError:
+            return
+        
+        for name in names:
+            if not (name.startswith('.') and name.endswith(cls.PARTS_SUFFIX)):
+                continue
+            filepath = os.path.join(video_dir, name[1:-len(cls.PARTS_SUFFIX)])
+            segments = cls(app, filepath)
+            print(f"Recovering unfinished recording: {filepath}")
+            segments.join(
+                lambda success, path=filepath: print(
+                    f"Recovered recording: {path}" if success
+                    else f"Could not recover recording: {path}"),
+                drop_last_on_error=True)
+
+
+class ReplayBuffer:
+    """The last few seconds of encoded video, kept as whole GOPs
     
-    def on_choose_video_dir(self, button):
-        """Open directory chooser for videos"""
-        dialog = Gtk.FileDialog()
-        dialog.set_title("Choose Recordings Location")
-        dialog.select_folder(None, None, self.on_video_dir_selected)
+    Encoded buffers are grouped into GOPs that start at a keyframe. The
+    oldest GOP is dropped once the rest still covers max_seconds, or while
+    the ring holds more than max_bytes, so a saved replay always starts on
+    a keyframe. The GOP being filled is always kept.
+    """
     
-    def on_video_dir_selected(self, dialog, result):
-        """Handle video directory selection"""
-        try:
-            folder = dialog.select_folder_finish(result)
-            if folder:
-                path = folder.get_path()
-                self.config.video_dir = path
-                self.video_row.set_subtitle(path)
-                self.config.save_config()
-        except Exception as e:
-            print(f"Error selecting folder: {e}")
+    def __init__(self, max_seconds, max_bytes):
+        self.max_duration = max_seconds * Gst.SECOND
+        self.max_bytes = max_bytes
+        # Each GOP is [buffers, total bytes]
+        self.gops = collections.deque()
+        self.bytes = 0
+        self.caps = None
+        self.lock = threading.Lock()
     
-    def on_start_capture(self, button):
-        """Start the capture selection interface"""
-        self.get_application().start_capture_session(self)
-        self.set_visible(False)
+    def push(self, sample):
+        """Add an encoded sample (runs on the streaming thread)"""
+        buffer = sample.get_buffer()
+        size = buffer.get_size()
+        with self.lock:
+            self.caps = sample.get_caps()
+            if not buffer.has_flags(Gst.BufferFlags.DELTA_UNIT):
+                self.gops.append([[], 0])
+            elif not self.gops:
+                # Nothing can be decoded before the first keyframe
+                return
+            gop = self.gops[-1]
+            gop[0].append(buffer)
+            gop[1] += size
+            self.bytes += size
+            
+            while len(self.gops) > 1 and (
+                    self.bytes > self.max_bytes or
+                    gop[0][-1].pts - self.gops[1][0][0].pts >= self.max_duration):
+                self.bytes -= self.gops.popleft()[1]
+    
+    def snapshot(self):
+        """Return (caps, buffers) of everything currently held"""
+        with self.lock:
+            return self.caps, [buffer for gop in self.gops for buffer in gop[0]]
 
 
 class ScreenCastSession:
     """Manages a ScreenCast portal session"""
     
-    def __init__(self, app, config):
+    def __init__(self, app, config, closed_callback=None):
         self.app = app
         self.config = config
+        self.closed_callback = closed_callback
+        self.closed_subscription = 0
         self.session_handle = None
         self.session_token = None
         self.request_token_counter = 0
-        self.pipewire_node = None
+        self.streams = []
         self.pipewire_fd = None
         self.is_recording = False
-        self.recording_process = None
+        self.recording_pipeline = None
         self.recording_filepath = None
+        self.recording_timings = None
+        self.recording_stats = None
+        self.recording_segments = None
+        self.recording_history = None
+        self.replay_pipeline = None
+        self.replay_buffer = None
+        self.replay_backend = None
+        self.replay_stream = None
+        self.replay_keyframe_timeout_id = 0
+        self.timings = None
         self.screenshot_callback = None
         
         # D-Bus proxies
@@ -213,6 +2482,16 @@ class ScreenCastSession:
     
     def start_session(self, callback=None):
         """Start a new ScreenCast session"""
+        timings = self.app.timing_log.begin('session')
+        user_callback = callback
+        
+        def callback(success):
+            timings.finish(success=success, streams=len(self.streams))
+            if user_callback:
+                user_callback(success)
+        
+        self.timings = timings
+        
         try:
             # Connect to ScreenCast portal
             self.portal = Gio.DBusProxy.new_for_bus_sync(
@@ -271,6 +2550,7 @@ class ScreenCastSession:
     
     def _on_create_session_response(self, parameters, callback):
         """Handle CreateSession response"""
+        self.timings.mark('create_session')
         response = parameters.get_child_value(0).get_uint32()
         results = parameters.get_child_value(1)
         
@@ -286,6 +2566,20 @@ class ScreenCastSession:
             self.session_handle = session_variant.get_string()
             print(f"Session created: {self.session_handle}")
             
+            # The compositor may end the session on its own (e.g. the user
+            # revokes sharing); find out so a stale session is not reused
+            connection = Gio.bus_get_sync(Gio.BusType.SESSION, None)
+            self.closed_subscription = connection.signal_subscribe(
+                'org.freedesktop.portal.Desktop',
+                'org.freedesktop.portal.Session',
+                'Closed',
+                self.session_handle,
+                None,
+                Gio.DBusSignalFlags.NONE,
+                lambda conn, sender, path, iface, signal, params: self._on_session_closed(),
+                None
+            )
+            
             # Next step: select sources
             self._select_sources(callback)
         else:
@@ -301,10 +2595,17 @@ class ScreenCastSession:
             options = {
                 'handle_token': GLib.Variant('s', request_token),
                 'types': GLib.Variant('u', 1 | 2),  # MONITOR | WINDOW
-                'multiple': GLib.Variant('b', False),
+                'multiple': GLib.Variant('b', True),
                 'cursor_mode': GLib.Variant('u', 2)  # Embedded
             }
             
+            # Persistence needs version 4 of the ScreenCast interface
+            version = self.portal.get_cached_property('version')
+            if version and version.get_uint32() >= 4:
+                options['persist_mode'] = GLib.Variant('u', 2)  # Until revoked
+                if self.config.restore_token:
+                    options['restore_token'] = GLib.Variant('s', self.config.restore_token)
+            
             # Subscribe to Request signal
             self._subscribe_to_request(request_token, self._on_select_sources_response, callback)
             
@@ -326,6 +2627,7 @@ class ScreenCastSession:
     
     def _on_select_sources_response(self, parameters, callback):
         """Handle SelectSources response"""
+        self.timings.mark('select_sources')
         response = parameters.get_child_value(0).get_uint32()
         
         if response != 0:
@@ -368,6 +2670,7 @@ class ScreenCastSession:
     
     def _on_start_response(self, parameters, callback):
         """Handle Start response"""
+        self.timings.mark('start')
         response = parameters.get_child_value(0).get_uint32()
         results = parameters.get_child_value(1)
         
@@ -377,15 +2680,24 @@ class ScreenCastSession:
                 callback(False)
             return
         
+        # Tokens are single use; store the new one for the next launch
+        token_variant = results.lookup_value('restore_token', None)
+        if token_variant:
+            self.config.restore_token = token_variant.get_string()
+            self.config.save_config()
+        
         # Get streams information
         streams_variant = results.lookup_value('streams', None)
         if streams_variant:
             streams = streams_variant.unpack()
             if streams:
-                # Get the first stream
-                node_id, properties = streams[0]
-                self.pipewire_node = node_id
-                print(f"PipeWire node ID: {self.pipewire_node}")
+                # One stream per selected source; they are matched to
+                # monitors by position and size
+                self.streams = [ScreenCastStream(node_id, properties)
+                                for node_id, properties in streams]
+                for stream in self.streams:
+                    print(f"PipeWire node ID: {stream.node_id} "
+                          f"(position {stream.position}, size {stream.size})")
                 
                 # Open PipeWire remote
                 self._open_pipewire_remote(callback)
@@ -402,12 +2714,13 @@ class ScreenCastSession:
         """Open PipeWire remote for the session"""
         try:
             # Call OpenPipeWireRemote
-            self.portal.call(
+            self.portal.call_with_unix_fd_list(
                 'OpenPipeWireRemote',
                 GLib.Variant('(oa{sv})', (self.session_handle, {})),
                 Gio.DBusCallFlags.NONE,
                 -1,
                 None,
+                None,
                 lambda proxy, result, data: self._on_pipewire_remote_opened(proxy, result, callback),
                 None
             )
@@ -420,90 +2733,137 @@ class ScreenCastSession:
     def _on_pipewire_remote_opened(self, proxy, result, callback):
         """Handle OpenPipeWireRemote response"""
         try:
-            res = proxy.call_finish(result)
-            if res:
-                fd_list = res.get_child_value(0)
-                # The file descriptor is returned as UnixFDList
-                # We'll use the node ID directly with gstreamer/ffmpeg
-                print("PipeWire remote opened successfully")
+            res, fd_list = proxy.call_with_unix_fd_list_finish(result)
+            self.timings.mark('open_remote')
+            if res and fd_list:
+                # The reply carries an index into the returned UnixFDList.
+                # This fd is the connection the portal authorised for our
+                # streams; every capture pipeline connects through it.
+                fd_index = res.get_child_value(0).get_handle()
+                self.pipewire_fd = fd_list.get(fd_index)
+                print(f"PipeWire remote opened successfully (fd {self.pipewire_fd})")
+                
+                # Keep a pipeline attached to each stream for the whole
+                # session so screenshots only have to pull a buffered frame
+                for stream in self.streams:
+                    stream.frame_grabber = FrameGrabber(stream.node_id, self.pipewire_fd)
+                    if not stream.frame_grabber.start():
+                        stream.frame_grabber = None
+                        if callback:
+                            callback(False)
+                        return
+                self.timings.mark('pipeline_start')
                 
                 if callback:
                     callback(True)
+            else:
+                print("No PipeWire remote returned")
+                if callback:
+                    callback(False)
         except Exception as e:
             print(f"Error processing PipeWire remote: {e}")
             if callback:
                 callback(False)
     
-    def take_screenshot(self, save_path, callback=None):
-        """Take a screenshot using the ScreenCast session"""
-        if not self.pipewire_node:
+    def get_stream_for_monitor(self, monitor):
+        """Pick the stream that shows monitor, or None if none does
+        
+        Falls back to a stream covering the monitor (a virtual full-desktop
+        source) and then to a stream without a position (a single
+        full-desktop or window source).
+        """
+        for stream in self.streams:
+            if stream.matches_monitor(monitor):
+                return stream
+        
+        geometry = monitor.get_geometry()
+        for stream in self.streams:
+            if stream.position == (geometry.x, geometry.y) or stream.contains_monitor(monitor):
+                return stream
+        
+        for stream in self.streams:
+            if stream.position is None:
+                return stream
+        
+        return None
+    
+    def get_stream_for_region(self, region):
+        """Pick the stream that shows most of a desktop region
+        
+        region is (x, y, width, height) in desktop coordinates, or None for
+        the first stream. Returns None if the region is outside every
+        stream.
+        """
+        if region is None:
+            return self.streams[0] if self.streams else None
+        
+        x, y, width, height = region
+        best, best_area = None, 0
+        for stream in self.streams:
+            if stream.position and stream.size:
+                stream_x, stream_y = stream.position
+                stream_w, stream_h = stream.size
+                overlap_w = min(x + width, stream_x + stream_w) - max(x, stream_x)
+                overlap_h = min(y + height, stream_y + stream_h) - max(y, stream_y)
+                if overlap_w > 0 and overlap_h > 0 and overlap_w * overlap_h > best_area:
+                    best, best_area = stream, overlap_w * overlap_h
+        if best:
+            return best
+        
+        # Without a position (e.g. a window source) we can't tell
+        for stream in self.streams:
+            if stream.position is None:
+                return stream
+        
+        return None
+    
+    def region_to_frame_rect(self, stream, region, frame_width, frame_height):
+        """Convert a desktop region to a rectangle in stream pixels
+        
+        Returns None if the region does not overlap the stream.
+        """
+        if region is None:
+            return 0, 0, frame_width, frame_height
+        
+        x, y, width, height = region
+        origin_x, origin_y = stream.get_origin()
+        # Streams are sized in logical pixels; frames are physical
+        scale = stream.get_scale(frame_width)
+        
+        return clamp_to_frame((x - origin_x) * scale, (y - origin_y) * scale,
+                              width * scale, height * scale,
+                              frame_width, frame_height)
+    
+    def capture_frame(self, stream, callback, settle=True):
+        """Capture a raw frame of stream; callback(frame or None) runs on the main loop
+        
+        settle=True waits for fresh frames so overlays that were just hidden
+        are not in the shot; pass False when nothing of ours is on screen.
+        """
+        if not stream or not stream.frame_grabber:
             print("No active ScreenCast session")
-            if callback:
-                callback(False, None)
+            callback(None)
             return
         
-        try:
-            # Use gstreamer to capture a single frame
-            cmd = [
-                'gst-launch-1.0',
-                '-q',
-                f'pipewiresrc path={self.pipewire_node}',
-                '!', 'videoconvert',
-                '!', 'pngenc',
-                '!', f'filesink location={save_path}',
-                'num-buffers=1'
-            ]
-            
-            # Try gstreamer first
-            result = subprocess.run(cmd, capture_output=True, timeout=5)
-            
-            if result.returncode == 0:
-                print(f"Screenshot saved: {save_path}")
-                if callback:
-                    callback(True, save_path)
-            else:
-                # Fallback to ffmpeg
-                self._screenshot_with_ffmpeg(save_path, callback)
-                
-        except FileNotFoundError:
-            # Try ffmpeg if gstreamer not available
-            self._screenshot_with_ffmpeg(save_path, callback)
-        except Exception as e:
-            print(f"Error taking screenshot: {e}")
-            if callback:
-                callback(False, None)
+        stream.frame_grabber.grab_frame(callback, settle)
     
-    def _screenshot_with_ffmpeg(self, save_path, callback):
-        """Take screenshot using ffmpeg"""
-        try:
-            cmd = [
-                'ffmpeg',
-                '-f', 'pipewire',
-                '-i', str(self.pipewire_node),
-                '-frames:v', '1',
-                '-y',
-                save_path
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, timeout=5)
-            
-            if result.returncode == 0:
-                print(f"Screenshot saved with ffmpeg: {save_path}")
-                if callback:
-                    callback(True, save_path)
-            else:
-                print(f"ffmpeg failed: {result.stderr.decode()}")
-                if callback:
-                    callback(False, None)
-                    
-        except Exception as e:
-            print(f"Error with ffmpeg screenshot: {e}")
-            if callback:
-                callback(False, None)
+    def get_frame_size(self, stream):
+        """Return (width, height) of stream in pixels, or None if unknown"""
+        if not stream or not stream.frame_grabber:
+            return None
+        return stream.frame_grabber.get_frame_size()
+    
+    # Frames the encoder queue absorbs before it drops; counted in frames,
+    # since the byte and time defaults hold a single 4K frame
+    ENCODE_QUEUE_FRAMES = 8
     
-    def start_recording(self, filepath):
-        """Start recording using the ScreenCast session"""
-        if not self.pipewire_node:
+    def start_recording(self, stream, filepath, crop_rect=None):
+        """Start recording stream using the ScreenCast session
+        
+        crop_rect is an optional (x, y, width, height) in stream pixels;
+        frames are cropped before conversion and encoding.
+        """
+        if not stream or self.pipewire_fd is None:
             print("No active ScreenCast session")
             return False
         
@@ -514,76 +2874,889 @@ class ScreenCastSession:
         try:
             self.recording_filepath = filepath
             
-            # Use ffmpeg to record from PipeWire
-            cmd = [
-                'ffmpeg',
-                '-f', 'pipewire',
-                '-i', str(self.pipewire_node),
-                '-c:v', 'libvpx-vp9',
-                '-b:v', '2M',
-                '-crf', '30',
-                '-y',
-                filepath
-            ]
+            backend = get_encoder_backend(self.config.encoder)
+            
+            # Crash-safe mode: closed, playable segments joined after stop
+            segments = None
+            if self.config.segment_seconds > 0:
+                segments = RecordingSegments(self.app, filepath)
+                os.makedirs(segments.parts_dir, exist_ok=True)
+                output = (f'! {backend.get_encoder_description()} '
+                          f'! splitmuxsink name=splitmux muxer-factory={backend.muxer.split()[0]} '
+                          f'max-size-time={self.config.segment_seconds * Gst.SECOND} '
+                          'send-keyframe-requests=true')
+            else:
+                output = (f'! {backend.get_pipeline_description()} '
+                          '! filesink name=filesink')
             
-            self.recording_process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL
+            # Encode the stream in-process over the portal's PipeWire fd
+            self.recording_pipeline = Gst.parse_launch(
+                pipewire_source_description(self.pipewire_fd, stream.node_id, 'do-timestamp=true') +
+                # Framerate cap for the adaptive controller; uncapped until it steps in
+                '! videorate name=rate drop-only=true '
+                '! videocrop name=crop '
+                '! videoconvert name=convert n-threads=0 '
+                # Leaky so a slow encoder drops frames (counted by
+                # RecordingStats) instead of stalling the capture
+                '! queue name=encodequeue leaky=downstream max-size-bytes=0 max-size-time=0 '
+                f'max-size-buffers={self.ENCODE_QUEUE_FRAMES} ' +
+                output
             )
+            if segments:
+                self.recording_pipeline.get_by_name('splitmux').set_property(
+                    'location', segments.get_location())
+            else:
+                self.recording_pipeline.get_by_name('filesink').set_property('location', filepath)
+            if crop_rect:
+                self._apply_recording_crop(stream, crop_rect)
+            controller = None
+            if self.config.recording_target in ('no-drops', 'cpu'):
+                controller = AdaptiveQualityController(
+                    self.recording_pipeline, backend, self.config.recording_target,
+                    self.config.recording_max_cpu)
+            frame_filter = None
+            if self.config.skip_unchanged_frames:
+                frame_filter = UnchangedFrameFilter(
+                    self.recording_pipeline.get_by_name('convert').get_static_pad('sink'))
+            stats = RecordingStats(self.recording_pipeline, backend.key, controller, frame_filter)
+            
+            timings = self.app.timing_log.begin('recording')
+            state_change = self.recording_pipeline.set_state(Gst.State.PLAYING)
+            timings.mark('pipeline_start')
+            if state_change == Gst.StateChangeReturn.FAILURE:
+                print("Failed to start recording pipeline")
+                timings.finish(success=False, encoder=backend.key)
+                self.recording_pipeline.set_state(Gst.State.NULL)
+                self.recording_pipeline = None
+                return False
             
             self.is_recording = True
-            print(f"Recording started: {filepath}")
+            self.recording_timings = timings
+            self.recording_stats = stats
+            self.recording_segments = segments
+            if crop_rect:
+                width, height = crop_rect[2] - crop_rect[2] % 2, crop_rect[3] - crop_rect[3] % 2
+            else:
+                width, height = self.get_frame_size(stream) or (None, None)
+            self.recording_history = {
+                'width': width, 'height': height, 'monitor': stream.describe(),
+                'region': crop_rect, 'file_format': backend.key,
+            }
+            stats.start()
+            print(f"Recording started with {backend.key}: {filepath}")
             return True
             
         except Exception as e:
             print(f"Error starting recording: {e}")
+            self.recording_pipeline = None
+            return False
+    
+    def _apply_recording_crop(self, stream, crop_rect):
+        """Configure the videocrop stage from a rectangle in stream pixels"""
+        frame_size = self.get_frame_size(stream)
+        if not frame_size:
+            print("Stream size unknown, recording full frame")
+            return
+        
+        frame_width, frame_height = frame_size
+        x, y, width, height = crop_rect
+        # Keep dimensions even so 4:2:0 encoders accept the cropped frames
+        width -= width % 2
+        height -= height % 2
+        
+        crop = self.recording_pipeline.get_by_name('crop')
+        crop.set_property('left', x)
+        crop.set_property('top', y)
+        crop.set_property('right', max(0, frame_width - x - width))
+        crop.set_property('bottom', max(0, frame_height - y - height))
+        print(f"Recording region {width}x{height}+{x}+{y}")
+    
+    # Seconds to wait for the muxer to finalise a recording after EOS
+    RECORDING_FINALISE_TIMEOUT = 10
+    
+    def stop_recording(self, callback=None):
+        """Stop the current recording
+        
+        Returns immediately; the file is finalised on the GStreamer bus (and
+        segments joined, in crash-safe mode) and callback(success) runs on
+        the main loop once it is written.
+        """
+        if not self.is_recording or not self.recording_pipeline:
+            return False
+        
+        pipeline = self.recording_pipeline
+        filepath = self.recording_filepath
+        timings = self.recording_timings
+        timings.mark('recording')
+        # Keep counting through finalisation, but nobody is watching now
+        stats = self.recording_stats
+        stats.update_callback = None
+        stats.drops_callback = None
+        segments = self.recording_segments
+        history = self.recording_history
+        self.recording_pipeline = None
+        self.recording_timings = None
+        self.recording_stats = None
+        self.recording_segments = None
+        self.recording_history = None
+        self.is_recording = False
+        state = {'done': False, 'timeout_id': 0}
+        
+        def finish(success):
+            if state['done']:
+                return
+            state['done'] = True
+            if state['timeout_id']:
+                GLib.source_remove(state['timeout_id'])
+            bus.remove_signal_watch()
+            pipeline.set_state(Gst.State.NULL)
+            self.app.release()
+            timings.mark('finalise')
+            timings.finish(success=success)
+            stats.stop()
+            summary = stats.get_summary()
+            history['duration'] = summary['duration']
+            print(f"Recording stats: {summary['encoded_frames']} frames encoded, "
+                  f"{summary['dropped_frames']} dropped, {summary['average_fps']} fps")
+            if self.config.recording_stats:
+                try:
+                    stats.write_sidecar(filepath)
+                except OSError as e:
+                    print(f"Error writing recording stats: {e}")
+            
+            # Even without a clean EOS the closed segments are usable
+            if segments:
+                segments.join(report)
+            else:
+                report(success)
+        
+        def report(success):
+            if success:
+                print(f"Recording saved: {filepath}")
+                self.app.history.add(filepath, 'recording', **history)
+            else:
+                print(f"Recording did not finish cleanly: {filepath}")
+            if callback:
+                callback(success)
+        
+        def on_message(bus, message):
+            if message.type == Gst.MessageType.EOS:
+                finish(True)
+            elif message.type == Gst.MessageType.ERROR:
+                error, debug = message.parse_error()
+                print(f"Recording error: {error.message}")
+                finish(False)
+        
+        def on_timeout():
+            state['timeout_id'] = 0
+            finish(False)
+            return False
+        
+        # Keep the application alive until the file is finalised
+        self.app.hold()
+        
+        try:
+            # Send EOS so the muxer can finalise the file; the bus tells us
+            # when it is done
+            bus = pipeline.get_bus()
+            bus.add_signal_watch()
+            bus.connect('message', on_message)
+            state['timeout_id'] = GLib.timeout_add_seconds(
+                self.RECORDING_FINALISE_TIMEOUT, on_timeout)
+            pipeline.send_event(Gst.Event.new_eos())
+            return True
+            
+        except Exception as e:
+            print(f"Error stopping recording: {e}")
+            state['done'] = True
+            pipeline.set_state(Gst.State.NULL)
+            self.app.release()
+            timings.finish(success=False)
+            stats.stop()
+            if callback:
+                callback(False)
             return False
     
-    def stop_recording(self):
-        """Stop the current recording"""
-        if not self.is_recording or not self.recording_process:
+    # The replay ring is trimmed, and saved replays start, at keyframes.
+    # Frames arrive only when the screen changes, so a keyframe is forced
+    # every REPLAY_KEYFRAME_SECONDS; the frame limit caps busy stretches.
+    REPLAY_KEYFRAME_SECONDS = 2
+    REPLAY_KEYFRAME_INTERVAL = 60
+    
+    def start_replay(self, stream):
+        """Keep the last config.replay_seconds of stream encoded in memory"""
+        if not stream or self.pipewire_fd is None:
+            print("No active ScreenCast session")
+            return False
+        if self.replay_pipeline:
+            return True
+        
+        backend = get_encoder_backend(self.config.encoder)
+        try:
+            pipeline = Gst.parse_launch(
+                pipewire_source_description(self.pipewire_fd, stream.node_id, 'do-timestamp=true') +
+                '! videoconvert name=convert n-threads=0 '
+                '! queue name=encodequeue leaky=downstream max-size-bytes=0 max-size-time=0 '
+                f'max-size-buffers={self.ENCODE_QUEUE_FRAMES} '
+                f'! {backend.get_encoder_description()} '
+                '! appsink name=replaysink emit-signals=true sync=false'
+            )
+        except GLib.Error as e:
+            print(f"Error creating replay pipeline: {e}")
+            return False
+        
+        if backend.keyframe_property:
+            pipeline.get_by_name('encoder').set_property(
+                backend.keyframe_property, self.REPLAY_KEYFRAME_INTERVAL)
+        if self.config.skip_unchanged_frames:
+            UnchangedFrameFilter(pipeline.get_by_name('convert').get_static_pad('sink'))
+        
+        replay_buffer = ReplayBuffer(self.config.replay_seconds,
+                                     self.config.replay_max_mb * 1024 * 1024)
+        pipeline.get_by_name('replaysink').connect(
+            'new-sample', lambda sink: self._on_replay_sample(sink, replay_buffer))
+        
+        if pipeline.set_state(Gst.State.PLAYING) == Gst.StateChangeReturn.FAILURE:
+            print("Failed to start replay pipeline")
+            pipeline.set_state(Gst.State.NULL)
+            return False
+        
+        self.replay_pipeline = pipeline
+        self.replay_buffer = replay_buffer
+        self.replay_backend = backend
+        self.replay_stream = stream
+        encoder_src = pipeline.get_by_name('encoder').get_static_pad('src')
+        self.replay_keyframe_timeout_id = GLib.timeout_add_seconds(
+            self.REPLAY_KEYFRAME_SECONDS, self._force_replay_keyframe, encoder_src)
+        print(f"Instant replay buffering {self.config.replay_seconds} s with {backend.key}")
+        return True
+    
+    @staticmethod
+    def _on_replay_sample(sink, replay_buffer):
+        sample = sink.emit('pull-sample')
+        if sample is None:
+            return Gst.FlowReturn.ERROR
+        replay_buffer.push(sample)
+        return Gst.FlowReturn.OK
+    
+    @staticmethod
+    def _force_replay_keyframe(encoder_src):
+        """Ask the encoder to make its next frame a keyframe"""
+        # The upstream GstForceKeyUnit event every video encoder handles
+        encoder_src.send_event(Gst.Event.new_custom(
+            Gst.EventType.CUSTOM_UPSTREAM,
+            Gst.Structure.new_from_string('GstForceKeyUnit, all-headers=(boolean)true')))
+        return True
+    
+    def is_replaying(self):
+        return self.replay_pipeline is not None
+    
+    def stop_replay(self):
+        """Stop buffering and free the ring"""
+        if self.replay_keyframe_timeout_id:
+            GLib.source_remove(self.replay_keyframe_timeout_id)
+            self.replay_keyframe_timeout_id = 0
+        if self.replay_pipeline:
+            self.replay_pipeline.set_state(Gst.State.NULL)
+        self.replay_pipeline = None
+        self.replay_buffer = None
+        self.replay_backend = None
+        self.replay_stream = None
+    
+    # Seconds a replay may take to write before it counts as failed
+    REPLAY_SAVE_TIMEOUT = 30
+    
+    def save_replay(self, filepath, callback):
+        """Write the buffered replay to filepath without re-encoding
+        
+        Buffering continues. callback(success) runs on the main loop once
+        the file is written.
+        """
+        if not self.replay_buffer:
+            callback(False)
+            return
+        
+        caps, buffers = self.replay_buffer.snapshot()
+        if not buffers:
+            print("Replay buffer is empty")
+            callback(False)
+            return
+        
+        try:
+            pipeline = Gst.parse_launch(
+                f'appsrc name=src format=time ! {self.replay_backend.muxer} '
+                '! filesink name=filesink')
+        except GLib.Error as e:
+            print(f"Error creating replay writer: {e}")
+            callback(False)
+            return
+        src = pipeline.get_by_name('src')
+        src.set_property('caps', caps)
+        pipeline.get_by_name('filesink').set_property('location', filepath)
+        
+        base = buffers[0].pts
+        
+        def feed():
+            # appsrc only accepts buffers once the pipeline is started.
+            # Start the file at zero; the buffers themselves are shared,
+            # only the copies' timestamps change.
+            for buffer in buffers:
+                copy = buffer.copy_region(Gst.BufferCopyFlags.ALL, 0, buffer.get_size())
+                copy.pts = buffer.pts - base
+                if buffer.dts != Gst.CLOCK_TIME_NONE and buffer.dts >= base:
+                    copy.dts = buffer.dts - base
+                else:
+                    copy.dts = Gst.CLOCK_TIME_NONE
+                result = src.emit('push-buffer', copy)
+                if result != Gst.FlowReturn.OK:
+                    print(f"Replay writer refused a buffer: {result}")
+                    return False
+            result = src.emit('end-of-stream')
+            if result != Gst.FlowReturn.OK:
+                print(f"Replay writer refused end of stream: {result}")
+                return False
+            return True
+        
+        duration = (buffers[-1].pts - base) / Gst.SECOND
+        print(f"Saving {duration:.1f} s replay to {filepath}")
+        
+        structure = caps.get_structure(0)
+        history = {
+            'width': structure.get_value('width'), 'height': structure.get_value('height'),
+            'monitor': self.replay_stream.describe(), 'file_format': self.replay_backend.key,
+            'duration': duration,
+        }
+        
+        def on_finished(success):
+            if success:
+                self.app.history.add(filepath, 'replay', **history)
+            callback(success)
+        
+        run_pipeline_to_eos(self.app, pipeline, on_finished, feed=feed,
+                            timeout=self.REPLAY_SAVE_TIMEOUT)
+    
+    def is_active(self):
+        """Whether the session has a stream ready for captures"""
+        return bool(self.streams) and all(stream.frame_grabber for stream in self.streams)
+    
+    def _on_session_closed(self):
+        """Handle the portal closing the session"""
+        print("ScreenCast session closed by portal")
+        self.session_handle = None
+        self.close_session()
+        if self.closed_callback:
+            self.closed_callback()
+    
+    def close_session(self):
+        """Close the ScreenCast session"""
+        if self.is_recording:
+            self.stop_recording()
+        self.stop_replay()
+        
+        for stream in self.streams:
+            if stream.frame_grabber:
+                stream.frame_grabber.stop()
+                stream.frame_grabber = None
+        
+        # Pipelines dup the fd when they connect, so ours can go now
+        if self.pipewire_fd is not None:
+            try:
+                os.close(self.pipewire_fd)
+            except OSError:
+                pass
+            self.pipewire_fd = None
+        
+        connection = Gio.bus_get_sync(Gio.BusType.SESSION, None)
+        if self.closed_subscription:
+            connection.signal_unsubscribe(self.closed_subscription)
+            self.closed_subscription = 0
+        
+        # Close the portal session so the compositor stops the stream
+        if self.session_handle:
+            connection.call(
+                'org.freedesktop.portal.Desktop',
+                self.session_handle,
+                'org.freedesktop.portal.Session',
+                'Close',
+                None,
+                None,
+                Gio.DBusCallFlags.NONE,
+                -1,
+                None,
+                None,
+                None
+            )
+        
+        self.session_handle = None
+        self.streams = []
+
+
+class ScreenCastSessionManager:
+    """Keeps one ScreenCast session alive across captures
+    
+    The session is started on first use, shared by every capture while it
+    is acquired, and closed after it has been idle for a while.
+    """
+    
+    IDLE_TIMEOUT_SECONDS = 60
+    
+    def __init__(self, app, config):
+        self.app = app
+        self.config = config
+        self.session = None
+        self.ready = False
+        self.users = 0
+        self.pending_callbacks = []
+        self.idle_timeout_id = 0
+    
+    def acquire(self, callback):
+        """Get a ready session; callback(session or None) may run immediately"""
+        self._cancel_idle_timeout()
+        self.users += 1
+        
+        if self.session and self.ready and self.session.is_active():
+            callback(self.session)
+            return
+        
+        self.pending_callbacks.append(callback)
+        if self.session is None:
+            self.ready = False
+            self.session = ScreenCastSession(self.app, self.config, self._on_session_closed)
+            self.session.start_session(self._on_session_started)
+    
+    def release(self):
+        """Give a session back; it is closed once idle for IDLE_TIMEOUT_SECONDS"""
+        self.users = max(0, self.users - 1)
+        if self.users == 0 and self.session:
+            self._cancel_idle_timeout()
+            self.idle_timeout_id = GLib.timeout_add_seconds(
+                self.IDLE_TIMEOUT_SECONDS, self._on_idle_timeout)
+    
+    def close(self):
+        """Close the session now"""
+        self._cancel_idle_timeout()
+        if self.session:
+            self.session.close_session()
+        self.session = None
+        self.ready = False
+    
+    def _on_session_started(self, success):
+        """Hand the started session to everyone waiting for it"""
+        callbacks = self.pending_callbacks
+        self.pending_callbacks = []
+        
+        if success:
+            self.ready = True
+            session = self.session
+        else:
+            if self.session:
+                self.session.close_session()
+            self.session = None
+            self.users = max(0, self.users - len(callbacks))
+            session = None
+        
+        for callback in callbacks:
+            callback(session)
+    
+    def _on_session_closed(self):
+        """Forget a session the portal has closed"""
+        self.session = None
+        self.ready = False
+    
+    def _on_idle_timeout(self):
+        """Tear down the session after a period without captures"""
+        self.idle_timeout_id = 0
+        if self.users == 0:
+            print("ScreenCast session idle, closing")
+            self.close()
+        return False
+    
+    def _cancel_idle_timeout(self):
+        if self.idle_timeout_id:
+            GLib.source_remove(self.idle_timeout_id)
+            self.idle_timeout_id = 0
+
+
+class ScreenshotSaveQueue:
+    """Bounded write-behind queue for screenshots
+    
+    Worker threads own cropping, encoding and the atomic file write, so the
+    capture UI is free again as soon as a frame has been handed over.
+    """
+    
+    MAX_PENDING = 16
+    # Encoding is mostly GIL-free C code, so bursts scale with cores
+    WORKERS = max(2, (os.cpu_count() or 2) // 2)
+    
+    def __init__(self, app):
+        self.app = app
+        self.jobs = queue.Queue(maxsize=self.MAX_PENDING)
+        for i in range(self.WORKERS):
+            worker = threading.Thread(target=self._run_worker,
+                                      name=f'simpleshot-save-{i}', daemon=True)
+            worker.start()
+    
+    def submit(self, frame, crop_rect, save_path, image_format, compression, quality,
+               fsync=False, overwrite=False, cropped_callback=None, saved_callback=None,
+               timings=None, history=None):
+        """Queue a screenshot for saving
+        
+        cropped_callback(cropped_frame) runs on the main loop as soon as the
+        crop is ready; saved_callback(save_path, error) once the file is
+        written. Unless overwrite is set, save_path may gain a counter if the
+        name is already taken; the callback gets the final path. Returns
+        False if the queue is full. timings, if given, gets the crop, encode,
+        write and clipboard stages and is finished with the job. history
+        holds extra CaptureHistory.add arguments (kind, monitor, and region
+        when frame is already cropped) for the saved file.
+        """
+        if timings is None:
+            timings = self.app.timing_log.begin('save')
+        # An explicit output path is always written
+        dedup = None
+        config = self.app.config
+        if config.dedup_mode != 'off' and not overwrite:
+            dedup = (config.dedup_mode,
+                     config.dedup_threshold if config.dedup_perceptual else None)
+        job = (frame, crop_rect, save_path, image_format, compression, quality,
+               fsync, overwrite, cropped_callback, saved_callback, timings, history or {},
+               dedup)
+        try:
+            self.jobs.put_nowait(job)
+        except queue.Full:
+            print("Screenshot save queue is full")
+            timings.finish(success=False, error="queue full")
+            return False
+        
+        # Keep the application alive until the file is on disk
+        self.app.hold()
+        return True
+    
+    def has_room(self):
+        """Whether submit() would accept a job now (submit from the main loop)"""
+        return not self.jobs.full()
+    
+    def _run_worker(self):
+        """Process save jobs forever (runs on a worker thread)"""
+        while True:
+            (frame, crop_rect, save_path, image_format, compression, quality,
+             fsync, overwrite, cropped_callback, saved_callback, timings,
+             history, dedup) = self.jobs.get()
+            timings.mark('queued')
+            
+            try:
+                with timings.stage('crop'):
+                    cropped_frame = frame.crop(*crop_rect)
+                if cropped_callback:
+                    GLib.idle_add(self._call_on_main_loop, timings, cropped_callback, cropped_frame)
+                
+                duplicate, dedup_keys = None, None
+                if dedup:
+                    with timings.stage('dedup'):
+                        duplicate, dedup_keys = self.app.duplicates.find(
+                            cropped_frame, image_format.key, dedup[1])
+                try:
+                    save_path = self._save(cropped_frame, crop_rect, save_path, image_format,
+                                           compression, quality, fsync, overwrite, timings,
+                                           history, dedup, duplicate, dedup_keys)
+                finally:
+                    self.app.duplicates.release(dedup_keys)
+                error = None
+            except Exception as e:
+                error = e
+            
+            timings.finish(success=error is None, format=image_format.key,
+                           width=crop_rect[2], height=crop_rect[3])
+            GLib.idle_add(self._finish_job, saved_callback, save_path, error)
+            self.jobs.task_done()
+    
+    def _save(self, cropped_frame, crop_rect, save_path, image_format, compression, quality,
+              fsync, overwrite, timings, history, dedup, duplicate, dedup_keys):
+        """Write (or skip, or link) one cropped screenshot; returns its path"""
+        if duplicate and dedup[0] == 'skip':
+            print(f"Screenshot matches {duplicate}, not saved again")
+            return duplicate
+        
+        if duplicate and dedup[0] == 'link':
+            try:
+                with timings.stage('write'):
+                    save_path = self.link_atomically(save_path, duplicate, overwrite)
+                self.app.history.add(
+                    save_path, history.get('kind', 'screenshot'),
+                    width=crop_rect[2], height=crop_rect[3], monitor=history.get('monitor'),
+                    region=history.get('region', crop_rect), file_format=image_format.key)
+                return save_path
+            except OSError as e:
+                # Other filesystem, or no hard links there: write a copy
+                print(f"Could not hard link {duplicate}: {e}")
+        
+        with timings.stage('encode'):
+            encoded_data = image_format.encode(cropped_frame, compression, quality)
+        with timings.stage('write'):
+            save_path = self.write_atomically(save_path, encoded_data, fsync, overwrite)
+        if dedup_keys:
+            self.app.duplicates.add(dedup_keys, save_path)
+        self.app.history.add(
+            save_path, history.get('kind', 'screenshot'),
+            width=crop_rect[2], height=crop_rect[3], monitor=history.get('monitor'),
+            region=history.get('region', crop_rect), file_format=image_format.key,
+            size=len(encoded_data))
+        return save_path
+    
+    @staticmethod
+    def write_atomically(path, data, fsync, overwrite=False):
+        """Write data to a temporary file next to path and rename it into place
+        
+        Unless overwrite is set, the final name is reserved with O_EXCL
+        first. Returns the path written.
+        """
+        directory = os.path.dirname(path)
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        if not overwrite:
+            path = reserve_capture_path(path)
+        temp_path = os.path.join(
+            directory, f".{os.path.basename(path)}.{threading.get_ident()}.part")
+        
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            for leftover in (temp_path, path) if not overwrite else (temp_path,):
+                try:
+                    os.remove(leftover)
+                except OSError:
+                    pass
+            raise
+        
+        if fsync:
+            # Make the rename itself durable
+            dir_fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+        
+        return path
+    
+    @staticmethod
+    def link_atomically(path, source, overwrite=False):
+        """Hard link source to path through a temporary name
+        
+        Unless overwrite is set, the final name is reserved with O_EXCL
+        first. Returns the path written.
+        """
+        directory = os.path.dirname(path)
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        if not overwrite:
+            path = reserve_capture_path(path)
+        temp_path = os.path.join(
+            directory, f".{os.path.basename(path)}.{threading.get_ident()}.part")
+        
+        try:
+            os.link(source, temp_path)
+            os.replace(temp_path, path)
+        except BaseException:
+            for leftover in (temp_path, path) if not overwrite else (temp_path,):
+                try:
+                    os.remove(leftover)
+                except OSError:
+                    pass
+            raise
+        
+        return path
+    
+    @staticmethod
+    def _call_on_main_loop(timings, callback, *args):
+        with timings.stage('clipboard'):
+            callback(*args)
+        return False
+    
+    def _finish_job(self, saved_callback, save_path, error):
+        try:
+            if saved_callback:
+                saved_callback(save_path, error)
+        finally:
+            self.app.release()
+        return False
+
+
+class CaptureSequence:
+    """Repeated captures of one selection from the live stream
+    
+    Burst mode takes count frames interval_ms apart; interval mode
+    (count=None) keeps going until stop() is called. Frames are cropped on
+    the worker pool as they arrive, then encoded and written in parallel by
+    the save queue as numbered files. When saving falls behind, the next
+    frame waits instead of being dropped.
+    """
+    
+    # Frames in flight (captured, cropping or queued) before ticks wait
+    MAX_PENDING = ScreenshotSaveQueue.MAX_PENDING // 2
+    # Retry period while the shared save queue is full
+    RETRY_MS = 20
+    
+    def __init__(self, app, config, session, stream, rect_for_frame, prefix,
+                 interval_ms, count=None, finished_callback=None):
+        self.app = app
+        self.config = config
+        self.session = session
+        self.stream = stream
+        self.rect_for_frame = rect_for_frame
+        self.interval_ms = interval_ms
+        self.count = count
+        self.finished_callback = finished_callback
+        
+        self.image_format = get_image_format(config.image_format)
+        self.prefix = prefix
+        self.base_name = f"{prefix}_{capture_timestamp()}"
+        
+        self.requested = 0
+        self.pending = 0
+        self.saved = 0
+        self.failed = 0
+        self.running = False
+        self.timeout_id = 0
+    
+    def start(self):
+        """Take the first frame now; the rest are scheduled once it arrives"""
+        self.running = True
+        # The first frame waits for the hidden overlay to leave the screen.
+        # Ticks only start after it, so they never get an older frame.
+        self._capture(settle=True)
+    
+    def stop(self):
+        """Stop taking frames; queued frames are still written"""
+        if self.timeout_id:
+            GLib.source_remove(self.timeout_id)
+            self.timeout_id = 0
+        if self.running:
+            self.running = False
+            self._check_finished()
+    
+    def _on_tick(self):
+        # Hold the next frame back while saving catches up
+        if self.pending < self.MAX_PENDING:
+            self._capture(settle=False)
+        if not self.running:
+            self.timeout_id = 0
             return False
+        return True
+    
+    def _capture(self, settle):
+        """Request the next frame of the sequence"""
+        self.requested += 1
+        index = self.requested
+        self.pending += 1
+        timings = self.app.timing_log.begin('sequence')
+        self.session.capture_frame(
+            self.stream, lambda frame: self._on_frame(frame, index, timings), settle)
         
-        try:
-            # Send SIGINT to ffmpeg for clean shutdown
-            self.recording_process.terminate()
-            self.recording_process.wait(timeout=10)
-            
-            print(f"Recording saved: {self.recording_filepath}")
-            self.is_recording = False
-            return True
-            
-        except Exception as e:
-            print(f"Error stopping recording: {e}")
-            # Force kill if terminate fails
-            try:
-                self.recording_process.kill()
-            except:
-                pass
-            self.is_recording = False
-            return False
+        if self.count is not None and self.requested >= self.count:
+            self.running = False
     
-    def close_session(self):
-        """Close the ScreenCast session"""
-        if self.is_recording:
-            self.stop_recording()
+    def _on_frame(self, frame, index, timings):
+        """Crop a captured frame, so only the selection waits in the queue"""
+        timings.mark('frame')
+        if index == 1 and self.running and not self.timeout_id:
+            self.timeout_id = GLib.timeout_add(self.interval_ms, self._on_tick)
+        if frame is None:
+            timings.finish(success=False, error="no frame")
+            self._on_saved(None, RuntimeError("no frame"))
+            return
         
-        # The session will be automatically closed when the app exits
-        # or we can explicitly call the Close method if needed
-        self.session_handle = None
-        self.pipewire_node = None
+        crop_rect = self.rect_for_frame(frame)
+        run_in_background(
+            frame.crop,
+            lambda cropped_frame, error: self._on_cropped(
+                cropped_frame, error, crop_rect, index, timings),
+            *crop_rect)
+    
+    def _on_cropped(self, cropped_frame, error, crop_rect, index, timings):
+        # The save worker's own crop stage is a no-op for these frames
+        timings.mark('pool_crop')
+        if error:
+            timings.finish(success=False, error=str(error))
+            self._on_saved(None, error)
+            return
+        self._submit(cropped_frame, crop_rect, index, timings)
+    
+    def _submit(self, cropped_frame, crop_rect, index, timings):
+        """Queue a cropped frame, waiting for room in the save queue"""
+        if not self.app.save_queue.has_room():
+            GLib.timeout_add(self.RETRY_MS, self._submit, cropped_frame, crop_rect, index, timings)
+            return False
+        
+        filename = f"{self.base_name}_{index:04d}.{self.image_format.extension}"
+        save_path = os.path.join(self.config.picture_dir, filename)
+        self.app.save_queue.submit(
+            cropped_frame, (0, 0, cropped_frame.width, cropped_frame.height), save_path,
+            self.image_format, self.config.png_compression, self.config.image_quality,
+            fsync=self.config.fsync_screenshots,
+            saved_callback=self._on_saved,
+            timings=timings,
+            history={'kind': self.prefix, 'monitor': self.stream.describe(),
+                     'region': crop_rect})
+        return False
+    
+    def _on_saved(self, save_path, error):
+        self.pending -= 1
+        if error:
+            print(f"Sequence frame not saved: {error}")
+            self.failed += 1
+        else:
+            self.saved += 1
+        self._check_finished()
+    
+    def _check_finished(self):
+        if self.running or self.pending > 0:
+            return
+        if self.finished_callback:
+            callback = self.finished_callback
+            self.finished_callback = None
+            callback(self)
+
+
+class SelectionOverlay(Gtk.Widget):
+    """Widget whose content comes from snapshot_func(snapshot, width, height)
+    
+    Unlike a Cairo DrawingArea it produces render nodes, which GSK can diff
+    between frames and composite without rasterising the whole window.
+    """
+    
+    def __init__(self, snapshot_func):
+        super().__init__()
+        self.snapshot_func = snapshot_func
+    
+    def do_snapshot(self, snapshot):
+        self.snapshot_func(snapshot, self.get_width(), self.get_height())
 
 
 class SelectionWindow(Gtk.Window):
     """Fullscreen overlay for area selection"""
     
-    def __init__(self, app, config, manager, monitor, screencast_session):
+    # Action menu layout, in menu coordinates
+    MENU_WIDTH = 300
+    MENU_HEIGHT = 60
+    MENU_BUTTON_SIZE = 40
+    MENU_BUTTON_SPACING = 20
+    MENU_BUTTONS = ('capture', 'record', 'burst', 'interval')
+    STATS_PANEL_WIDTH = 440
+    
+    def __init__(self, app, config, manager, monitor, screencast_session, frozen_frame=None):
         super().__init__(application=app)
         self.config = config
         self.manager = manager
         self.monitor = monitor
         self.screencast_session = screencast_session
+        # Only this monitor's stream is captured from this window
+        self.stream = screencast_session.get_stream_for_monitor(monitor)
+        # Frame of that stream captured before the overlay was shown, if
+        # pre-capturing
+        self.frozen_frame = frozen_frame
         
         # Window setup
         self.set_decorated(False)
@@ -606,96 +3779,163 @@ class SelectionWindow(Gtk.Window):
         self.end_y = 0
         self.is_selecting = False
         self.is_recording = False
+        # Latest pointer position not yet applied; motion is applied once
+        # per frame clock tick
+        self.pending_motion = None
+        self.motion_tick_id = 0
+        
+        # Cached menu and stats panel nodes (see snapshot_overlay)
+        self.menu_node = None
+        self.menu_node_recording = False
+        self.menu_rect = None
+        self.menu_button_rects = {}
+        self.stats_node = None
+        self.stats_node_key = None
         
-        # Drawing area
-        self.drawing_area = Gtk.DrawingArea()
-        self.drawing_area.set_draw_func(self.on_draw)
-        self.set_child(self.drawing_area)
+        # Overlay drawing
+        self.selection_overlay = SelectionOverlay(self.snapshot_overlay)
+        
+        # Show the frozen frame under the overlay so the user selects from
+        # exactly what will be saved
+        overlay = Gtk.Overlay()
+        self.background = Gtk.Picture()
+        self.background.set_can_shrink(True)
+        self.background.set_content_fit(Gtk.ContentFit.FILL)
+        self.background.set_can_target(False)
+        if self.frozen_frame:
+            self.background.set_paintable(self.get_monitor_texture(self.frozen_frame))
+        else:
+            self.background.set_visible(False)
+        overlay.set_child(self.background)
+        overlay.add_overlay(self.selection_overlay)
+        self.set_child(overlay)
         
         # Event controllers
         # Mouse press
         press_gesture = Gtk.GestureClick()
         press_gesture.connect("pressed", self.on_mouse_press)
-        self.drawing_area.add_controller(press_gesture)
+        self.selection_overlay.add_controller(press_gesture)
         
         # Mouse release
         release_gesture = Gtk.GestureClick()
         release_gesture.connect("released", self.on_mouse_release)
-        self.drawing_area.add_controller(release_gesture)
+        self.selection_overlay.add_controller(release_gesture)
         
         # Mouse motion
         motion_controller = Gtk.EventControllerMotion()
         motion_controller.connect("motion", self.on_mouse_motion)
-        self.drawing_area.add_controller(motion_controller)
+        self.selection_overlay.add_controller(motion_controller)
         
         # Keyboard
         key_controller = Gtk.EventControllerKey()
         key_controller.connect("key-pressed", self.on_key_press)
         self.add_controller(key_controller)
         
-    def on_draw(self, area, cr, width, height):
-        """Draw the selection overlay"""
-        # Semi-transparent dark overlay
-        cr.set_source_rgba(0, 0, 0, 0.5)
-        cr.paint()
-        
-        if self.is_selecting or (self.end_x != 0 and self.end_y != 0):
-            # Clear selected area
-            x = min(self.start_x, self.end_x)
-            y = min(self.start_y, self.end_y)
-            w = abs(self.end_x - self.start_x)
-            h = abs(self.end_y - self.start_y)
-            
-            # Clear rectangle (show through)
-            cr.set_operator(0)  # OPERATOR_CLEAR
-            cr.rectangle(x, y, w, h)
-            cr.fill()
-            
-            # Draw border
-            cr.set_operator(2)  # OPERATOR_OVER
+    def get_selection_rect(self):
+        """Current selection as (x, y, width, height) in window coordinates"""
+        x = min(self.start_x, self.end_x)
+        y = min(self.start_y, self.end_y)
+        return x, y, abs(self.end_x - self.start_x), abs(self.end_y - self.start_y)
+    
+    def snapshot_overlay(self, snapshot, width, height):
+        """Build the overlay from render nodes
+        
+        The dim layer is four colour rectangles around the selection, so GSK
+        only repaints the strips that move; the menu and stats panel are
+        Cairo-drawn once into cached nodes and just translated.
+        """
+        self.menu_button_rects = {}
+        dim = Gdk.RGBA(0, 0, 0, 0.5)
+        if not (self.is_selecting or (self.end_x != 0 and self.end_y != 0)):
+            snapshot.append_color(dim, Graphene.Rect().init(0, 0, width, height))
+            return
+        
+        x, y, w, h = self.get_selection_rect()
+        for rect in ((0, 0, width, y),
+                     (0, y + h, width, height - y - h),
+                     (0, y, x, h),
+                     (x + w, y, width - x - w, h)):
+            if rect[2] > 0 and rect[3] > 0:
+                snapshot.append_color(dim, Graphene.Rect().init(*rect))
+        
+        # Border, centred on the selection edge
+        if self.is_recording:
+            color = Gdk.RGBA(1, 0, 0, 1)  # Red for recording
+            line_width = 4
+        else:
+            color = Gdk.RGBA(0.3, 0.6, 1, 1)  # Blue
+            line_width = 2
+        outline = Gsk.RoundedRect()
+        outline.init_from_rect(Graphene.Rect().init(
+            x - line_width / 2, y - line_width / 2, w + line_width, h + line_width), 0)
+        snapshot.append_border(outline, [line_width] * 4, [color] * 4)
+        
+        # Menu if selection is complete
+        if not self.is_selecting and w > 50 and h > 50:
+            self.snapshot_menu(snapshot, height, x, y, w, h)
             if self.is_recording:
-                cr.set_source_rgb(1, 0, 0)  # Red for recording
-                cr.set_line_width(4)
-            else:
-                cr.set_source_rgb(0.3, 0.6, 1)  # Blue
-                cr.set_line_width(2)
-            cr.rectangle(x, y, w, h)
-            cr.stroke()
-            
-            # Draw menu if selection is complete
-            if not self.is_selecting and w > 50 and h > 50:
-                self.draw_menu(cr, width, height, x, y, w, h)
-    
-    def draw_menu(self, cr, screen_w, screen_h, sel_x, sel_y, sel_w, sel_h):
-        """Draw the action menu"""
-        # Menu dimensions
-        menu_width = 200
-        menu_height = 60
-        menu_x = sel_x + (sel_w / 2) - (menu_width / 2)
+                self.snapshot_recording_stats(snapshot, height)
+    
+    def append_cached_node(self, snapshot, node, x, y):
+        """Place a pre-rendered node at (x, y)"""
+        snapshot.save()
+        snapshot.translate(Graphene.Point().init(x, y))
+        snapshot.append_node(node)
+        snapshot.restore()
+    
+    def render_cairo_node(self, width, height, draw_func, *args):
+        """Render draw_func(cr, *args) once into a reusable node"""
+        node_snapshot = Gtk.Snapshot()
+        cr = node_snapshot.append_cairo(Graphene.Rect().init(0, 0, width, height))
+        draw_func(cr, *args)
+        return node_snapshot.to_node()
+    
+    def snapshot_menu(self, snapshot, screen_h, sel_x, sel_y, sel_w, sel_h):
+        """Place the action menu under (or above) the selection"""
+        menu_x = sel_x + (sel_w / 2) - (self.MENU_WIDTH / 2)
         menu_y = sel_y + sel_h + 20
-
-        # position menu inside selection rectangle if it goes off screen
-        if menu_y + menu_height > screen_h:
-            menu_y = sel_y - menu_height - 20
         
+        # position menu above the selection if it goes off screen
+        if menu_y + self.MENU_HEIGHT > screen_h:
+            menu_y = sel_y - self.MENU_HEIGHT - 20
+        
+        # The icons only change when recording starts or stops
+        if self.menu_node is None or self.menu_node_recording != self.is_recording:
+            self.menu_node = self.render_cairo_node(
+                self.MENU_WIDTH, self.MENU_HEIGHT, self.draw_menu)
+            self.menu_node_recording = self.is_recording
+        self.append_cached_node(snapshot, self.menu_node, menu_x, menu_y)
+        
+        # Store button positions for click detection
+        self.menu_rect = (menu_x, menu_y, self.MENU_WIDTH, self.MENU_HEIGHT)
+        self.menu_button_rects = {
+            name: (menu_x + bx, menu_y + by, self.MENU_BUTTON_SIZE, self.MENU_BUTTON_SIZE)
+            for name, (bx, by) in self.get_menu_button_offsets().items()
+        }
+    
+    def get_menu_button_offsets(self):
+        """Top-left corner of each menu button in menu coordinates"""
+        step = self.MENU_BUTTON_SIZE + self.MENU_BUTTON_SPACING
+        return {name: (40 + i * step, 10) for i, name in enumerate(self.MENU_BUTTONS)}
+    
+    def draw_menu(self, cr):
+        """Draw the action menu at the origin"""
         # Menu background
         cr.set_source_rgba(0.2, 0.2, 0.2, 0.95)
-        self.draw_rounded_rect(cr, menu_x, menu_y, menu_width, menu_height, 10)
+        self.draw_rounded_rect(cr, 0, 0, self.MENU_WIDTH, self.MENU_HEIGHT, 10)
         cr.fill()
         
         # Menu border
         cr.set_source_rgb(0.4, 0.4, 0.4)
         cr.set_line_width(1)
-        self.draw_rounded_rect(cr, menu_x, menu_y, menu_width, menu_height, 10)
+        self.draw_rounded_rect(cr, 0, 0, self.MENU_WIDTH, self.MENU_HEIGHT, 10)
         cr.stroke()
         
-        # Buttons
-        button_size = 40
-        spacing = 20
+        button_size = self.MENU_BUTTON_SIZE
+        offsets = self.get_menu_button_offsets()
         
         # Capture button (camera icon)
-        capture_x = menu_x + 40
-        capture_y = menu_y + 10
+        capture_x, capture_y = offsets['capture']
         cr.set_source_rgb(0.3, 0.6, 1)
         cr.arc(capture_x + button_size/2, capture_y + button_size/2, button_size/2, 0, 2 * 3.14159)
         cr.fill()
@@ -706,8 +3946,7 @@ class SelectionWindow(Gtk.Window):
         cr.fill()
         
         # Record button (red dot icon)
-        record_x = menu_x + 40 + button_size + spacing
-        record_y = menu_y + 10
+        record_x, record_y = offsets['record']
         if self.is_recording:
             cr.set_source_rgb(0.5, 0.5, 0.5)  # Gray when recording
         else:
@@ -725,9 +3964,70 @@ class SelectionWindow(Gtk.Window):
             cr.arc(record_x + button_size/2, record_y + button_size/2, 10, 0, 2 * 3.14159)
         cr.fill()
         
-        # Store button positions for click detection
-        self.capture_button = (capture_x, capture_y, button_size, button_size)
-        self.record_button = (record_x, record_y, button_size, button_size)
+        # Burst button (three dots icon)
+        burst_x, burst_y = offsets['burst']
+        cr.set_source_rgb(0.3, 0.6, 1)
+        cr.arc(burst_x + button_size/2, burst_y + button_size/2, button_size/2, 0, 2 * 3.14159)
+        cr.fill()
+        
+        cr.set_source_rgb(1, 1, 1)
+        for offset in (-10, 0, 10):
+            cr.arc(burst_x + button_size/2 + offset, burst_y + button_size/2, 4, 0, 2 * 3.14159)
+            cr.fill()
+        
+        # Interval button (clock icon)
+        interval_x, interval_y = offsets['interval']
+        cr.set_source_rgb(0.3, 0.6, 1)
+        cr.arc(interval_x + button_size/2, interval_y + button_size/2, button_size/2, 0, 2 * 3.14159)
+        cr.fill()
+        
+        cr.set_source_rgb(1, 1, 1)
+        cr.set_line_width(2)
+        cr.arc(interval_x + button_size/2, interval_y + button_size/2, 11, 0, 2 * 3.14159)
+        cr.stroke()
+        cr.move_to(interval_x + button_size/2, interval_y + button_size/2 - 7)
+        cr.line_to(interval_x + button_size/2, interval_y + button_size/2)
+        cr.line_to(interval_x + button_size/2 + 5, interval_y + button_size/2)
+        cr.stroke()
+    
+    def snapshot_recording_stats(self, snapshot, screen_h):
+        """Place live recording stats next to the menu, outside the recorded area"""
+        stats = self.screencast_session.recording_stats
+        if not stats:
+            return
+        
+        # Re-rendered only when a new sample changes the text
+        lines = tuple(stats.format_lines())
+        panel_height = 16 + 18 * len(lines)
+        if self.stats_node is None or self.stats_node_key != (lines, stats.dropping):
+            self.stats_node = self.render_cairo_node(
+                self.STATS_PANEL_WIDTH, panel_height, self.draw_recording_stats,
+                lines, stats.dropping)
+            self.stats_node_key = (lines, stats.dropping)
+        
+        menu_x, menu_y, menu_width, menu_height = self.menu_rect
+        panel_x = menu_x + (menu_width / 2) - (self.STATS_PANEL_WIDTH / 2)
+        panel_y = menu_y + menu_height + 10
+        if panel_y + panel_height > screen_h:
+            panel_y = menu_y - panel_height - 10
+        self.append_cached_node(snapshot, self.stats_node, panel_x, panel_y)
+    
+    def draw_recording_stats(self, cr, lines, dropping):
+        """Draw the stats panel at the origin"""
+        panel_height = 16 + 18 * len(lines)
+        cr.set_source_rgba(0.2, 0.2, 0.2, 0.95)
+        self.draw_rounded_rect(cr, 0, 0, self.STATS_PANEL_WIDTH, panel_height, 10)
+        cr.fill()
+        
+        cr.select_font_face("monospace", 0, 0)  # SLANT_NORMAL, WEIGHT_NORMAL
+        cr.set_font_size(12)
+        for i, line in enumerate(lines):
+            if i == 1 and dropping:
+                cr.set_source_rgb(1, 0.6, 0.2)  # Orange while dropping frames
+            else:
+                cr.set_source_rgb(1, 1, 1)
+            cr.move_to(14, 22 + 18 * i)
+            cr.show_text(line)
     
     def draw_rounded_rect(self, cr, x, y, width, height, radius):
         """Draw a rounded rectangle"""
@@ -741,16 +4041,17 @@ class SelectionWindow(Gtk.Window):
         """Handle mouse press"""
         if not self.is_selecting and self.end_x != 0:
             # Check if clicking on menu buttons
-            if hasattr(self, 'capture_button'):
-                bx, by, bw, bh = self.capture_button
-                if bx <= x <= bx + bw and by <= y <= by + bh:
-                    self.take_screenshot()
-                    return
-            
-            if hasattr(self, 'record_button'):
-                bx, by, bw, bh = self.record_button
+            actions = {
+                'capture': self.take_screenshot,
+                'record': self.toggle_recording,
+                'burst': lambda: self.start_capture_sequence(burst=True),
+                'interval': lambda: self.start_capture_sequence(burst=False),
+            }
+            for name, (bx, by, bw, bh) in self.menu_button_rects.items():
+                if name in ('burst', 'interval') and self.is_recording:
+                    continue
                 if bx <= x <= bx + bw and by <= y <= by + bh:
-                    self.toggle_recording()
+                    actions[name]()
                     return
             
             # Reset selection
@@ -765,22 +4066,35 @@ class SelectionWindow(Gtk.Window):
             self.end_y = y
         
         self.is_selecting = True
-        self.drawing_area.queue_draw()
+        self.selection_overlay.queue_draw()
     
     def on_mouse_release(self, gesture, n_press, x, y):
         """Handle mouse release"""
         if self.is_selecting:
             self.end_x = x
             self.end_y = y
+            self.pending_motion = None
             self.is_selecting = False
-            self.drawing_area.queue_draw()
+            self.selection_overlay.queue_draw()
     
     def on_mouse_motion(self, controller, x, y):
         """Handle mouse motion"""
         if self.is_selecting:
-            self.end_x = x
-            self.end_y = y
-            self.drawing_area.queue_draw()
+            # High-rate pointers send several events per frame; keep the
+            # last one and apply it on the next frame clock tick
+            self.pending_motion = (x, y)
+            if not self.motion_tick_id:
+                self.motion_tick_id = self.selection_overlay.add_tick_callback(
+                    self.on_motion_tick)
+    
+    def on_motion_tick(self, widget, frame_clock):
+        """Apply the latest pointer position once per frame"""
+        self.motion_tick_id = 0
+        if self.pending_motion and self.is_selecting:
+            self.end_x, self.end_y = self.pending_motion
+            self.selection_overlay.queue_draw()
+        self.pending_motion = None
+        return GLib.SOURCE_REMOVE
     
     def on_key_press(self, controller, keyval, keycode, state):
         """Handle keyboard events"""
@@ -791,6 +4105,17 @@ class SelectionWindow(Gtk.Window):
             return True
         return False
     
+    def get_monitor_texture(self, frame):
+        """Texture of the part of frame that shows this window's monitor"""
+        monitor_geometry = self.monitor.get_geometry()
+        crop_rect = self.selection_to_frame_rect(
+            0, 0, monitor_geometry.width, monitor_geometry.height,
+            frame.width, frame.height)
+        # Usually the stream is exactly this monitor: skip copying the frame
+        if tuple(crop_rect) == (0, 0, frame.width, frame.height):
+            return frame.to_texture()
+        return frame.crop(*crop_rect).to_texture()
+    
     def take_screenshot(self):
         """Take a screenshot using ScreenCast"""
         x = int(min(self.start_x, self.end_x))
@@ -801,78 +4126,135 @@ class SelectionWindow(Gtk.Window):
         if w < 10 or h < 10:
             return
         
+        timings = self.manager.timing_log.begin('screenshot')
+        self.manager.hide_all_selection_windows()
+        
+        # Pre-captured: crop from the frame we already have
+        if self.frozen_frame:
+            timings.mark('frame')
+            self.on_screenshot_taken(self.frozen_frame, x, y, w, h, timings)
+            return
+        
+        # Grab a raw frame from the ScreenCast session
+        self.screencast_session.capture_frame(
+            self.stream,
+            lambda frame: self.on_screenshot_taken(frame, x, y, w, h, timings))
+    
+    def start_capture_sequence(self, burst):
+        """Start a burst or interval capture of the selection"""
+        x = int(min(self.start_x, self.end_x))
+        y = int(min(self.start_y, self.end_y))
+        w = int(abs(self.end_x - self.start_x))
+        h = int(abs(self.end_y - self.start_y))
+        
+        if w < 10 or h < 10:
+            return
+        
+        # Sequences need the live stream, and the overlay must stay out of it
         self.manager.hide_all_selection_windows()
         
-        # Generate temporary filename
-        temp_path = os.path.join('/tmp', f'simpleshot_{datetime.now().strftime("%Y%m%d_%H%M%S")}.png')
+        if burst:
+            sequence = CaptureSequence(
+                self.manager, self.config, self.screencast_session, self.stream,
+                lambda frame: self.selection_to_frame_rect(x, y, w, h, frame.width, frame.height),
+                'burst', self.config.burst_interval_ms, count=self.config.burst_count)
+        else:
+            sequence = CaptureSequence(
+                self.manager, self.config, self.screencast_session, self.stream,
+                lambda frame: self.selection_to_frame_rect(x, y, w, h, frame.width, frame.height),
+                'interval', self.config.interval_seconds * 1000)
+        
+        self.manager.start_capture_sequence(sequence)
+    
+    def selection_to_frame_rect(self, sel_x, sel_y, sel_w, sel_h, frame_width, frame_height):
+        """Convert a selection in widget coordinates to a rectangle in stream pixels"""
+        # Get monitor geometry for cropping
+        monitor_geometry = self.monitor.get_geometry()
+        scale = self.monitor.get_scale_factor()
+        if self.stream:
+            # Fractional scaling: only the frame knows the real scale
+            scale = self.stream.get_scale(frame_width, scale)
+        
+        # Where this window's stream starts on the desktop; a single
+        # full-desktop stream starts at the origin
+        origin_x, origin_y = self.stream.get_origin() if self.stream else (0, 0)
+        
+        # Calculate crop coordinates (in physical pixels)
+        crop_x = (sel_x + monitor_geometry.x - origin_x) * scale
+        crop_y = (sel_y + monitor_geometry.y - origin_y) * scale
+        crop_w = sel_w * scale
+        crop_h = sel_h * scale
         
-        # Take screenshot using ScreenCast session
-        self.screencast_session.take_screenshot(temp_path, 
-            lambda success, path: self.on_screenshot_taken(success, path, x, y, w, h))
+        # Ensure coordinates are within bounds
+        return clamp_to_frame(crop_x, crop_y, crop_w, crop_h, frame_width, frame_height)
     
-    def on_screenshot_taken(self, success, temp_path, sel_x, sel_y, sel_w, sel_h):
+    def on_screenshot_taken(self, frame, sel_x, sel_y, sel_w, sel_h, timings):
         """Handle screenshot completion"""
-        if not success or not temp_path or not os.path.exists(temp_path):
+        timings.mark('frame')
+        if frame is None:
+            timings.finish(success=False, error="no frame")
             self.show_notification("Screenshot failed")
             self.manager.end_capture_session()
             return
         
-        try:
-            # Load the full screenshot
-            pixbuf = GdkPixbuf.Pixbuf.new_from_file(temp_path)
-            
-            # Get monitor geometry for cropping
-            monitor_geometry = self.monitor.get_geometry()
-            scale = self.monitor.get_scale_factor()
-            
-            # Calculate crop coordinates (in physical pixels)
-            # Note: ScreenCast gives us full screen, need to crop to selection
-            crop_x = (sel_x + monitor_geometry.x) * scale
-            crop_y = (sel_y + monitor_geometry.y) * scale
-            crop_w = sel_w * scale
-            crop_h = sel_h * scale
-            
-            # Ensure coordinates are within bounds
-            img_width = pixbuf.get_width()
-            img_height = pixbuf.get_height()
-            
-            crop_x = max(0, min(crop_x, img_width - 1))
-            crop_y = max(0, min(crop_y, img_height - 1))
-            crop_w = min(crop_w, img_width - crop_x)
-            crop_h = min(crop_h, img_height - crop_y)
-            
-            # Crop to selected area
-            cropped_pixbuf = pixbuf.new_subpixbuf(int(crop_x), int(crop_y), int(crop_w), int(crop_h))
-            
-            # Save to final location
-            Path(self.config.picture_dir).mkdir(parents=True, exist_ok=True)
-            timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-            filename = f"screenshot_{timestamp}.png"
-            save_path = os.path.join(self.config.picture_dir, filename)
-            
-            cropped_pixbuf.savev(save_path, "png", [], [])
-            
-            self.show_notification(f"Screenshot saved")
-            self.copy_to_clipboard(save_path)
-            
-            # Clean up temp file
-            try:
-                os.remove(temp_path)
-            except:
-                pass
-                
-        except Exception as e:
-            print(f"Error processing screenshot: {e}")
+        # Cropping and encoding happen off the main loop
+        crop_rect = self.selection_to_frame_rect(
+            sel_x, sel_y, sel_w, sel_h, frame.width, frame.height)
+        if not self.config.save_screenshots:
+            # Clipboard only: crop and hand over the pixels, never encode
+            timings.finish(success=True, clipboard_only=True)
+            run_in_background(frame.crop, self.on_screenshot_copied, *crop_rect)
+            return
+        
+        # Hand the frame to the save queue; the overlay is done now
+        image_format = get_image_format(self.config.image_format)
+        filename = f"screenshot_{capture_timestamp()}.{image_format.extension}"
+        save_path = os.path.join(self.config.picture_dir, filename)
+        
+        queued = self.manager.save_queue.submit(
+            frame, crop_rect, save_path, image_format,
+            self.config.png_compression, self.config.image_quality,
+            fsync=self.config.fsync_screenshots,
+            cropped_callback=self.copy_to_clipboard,
+            saved_callback=self.on_screenshot_saved,
+            timings=timings,
+            history={'monitor': self.stream.describe() if self.stream else self.monitor.get_connector()})
+        if not queued:
+            self.show_notification("Too many screenshots pending, please wait")
+        
+        self.manager.end_capture_session()
+    
+    def on_screenshot_saved(self, save_path, error):
+        """Handle the end of the background save"""
+        if error:
+            print(f"Error saving screenshot: {error}")
             self.show_notification("Error saving screenshot")
+        else:
+            print(f"Screenshot saved: {save_path}")
+            self.show_notification(f"Screenshot saved")
+    
+    def on_screenshot_copied(self, cropped_frame, error):
+        """Handle the end of a clipboard-only capture"""
+        if error:
+            print(f"Error processing screenshot: {error}")
+            self.show_notification("Screenshot failed")
+        else:
+            self.copy_to_clipboard(cropped_frame)
+            self.show_notification("Screenshot copied to clipboard")
         
         self.manager.end_capture_session()
     
-    def copy_to_clipboard(self, filepath):
-        """Copy image to clipboard"""
+    def copy_to_clipboard(self, frame):
+        """Copy a frame to clipboard
+        
+        The raw pixels go straight into a Gdk.MemoryTexture. GDK only
+        serializes it (e.g. to image/png) when another application actually
+        requests that format from the clipboard.
+        """
         try:
-            pixbuf = GdkPixbuf.Pixbuf.new_from_file(filepath)
+            texture = frame.to_texture()
             clipboard = Gdk.Display.get_default().get_clipboard()
-            clipboard.set_texture(Gdk.Texture.new_for_pixbuf(pixbuf))
+            clipboard.set_texture(texture)
             print("Copied to clipboard")
         except Exception as e:
             print(f"Error copying to clipboard: {e}")
@@ -881,7 +4263,9 @@ class SelectionWindow(Gtk.Window):
         """Show a notification"""
         notification = Gio.Notification.new("SimpleShot")
         notification.set_body(message)
-        self.get_application().send_notification(None, notification)
+        # Use the manager rather than get_application(): notifications can
+        # arrive from background work after this window has been closed
+        self.manager.send_notification(None, notification)
     
     def toggle_recording(self):
         """Toggle screen recording"""
@@ -902,25 +4286,35 @@ class SelectionWindow(Gtk.Window):
         if w < 10 or h < 10:
             return
         
-        # Note: We're recording the full screen via ScreenCast
-        # Area selection is currently for visual feedback only
-        # TODO: Implement cropping for recordings if needed
+        # Recordings are live; stop showing the frozen frame
+        self.manager.drop_frozen_frame()
+        
+        # Crop to the selection inside the encoding pipeline, using the same
+        # conversion as screenshots
+        crop_rect = None
+        frame_size = self.screencast_session.get_frame_size(self.stream)
+        if frame_size:
+            crop_rect = self.selection_to_frame_rect(x, y, w, h, *frame_size)
         
         try:
             # Create output directory
             Path(self.config.video_dir).mkdir(parents=True, exist_ok=True)
             
-            # Generate filename
-            timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-            filename = f"recording_{timestamp}.webm"
-            filepath = os.path.join(self.config.video_dir, filename)
+            # Generate filename, reserving it so nothing else can take it
+            backend = get_encoder_backend(self.config.encoder)
+            filename = f"recording_{capture_timestamp()}.{backend.extension}"
+            filepath = reserve_capture_path(os.path.join(self.config.video_dir, filename))
             
             # Start recording via ScreenCast session
-            if self.screencast_session.start_recording(filepath):
+            if self.screencast_session.start_recording(self.stream, filepath, crop_rect):
                 self.is_recording = True
-                self.drawing_area.queue_draw()
+                stats = self.screencast_session.recording_stats
+                stats.update_callback = lambda stats: self.selection_overlay.queue_draw()
+                stats.drops_callback = self.on_recording_dropping_frames
+                self.selection_overlay.queue_draw()
                 self.show_notification("Recording started")
             else:
+                os.remove(filepath)
                 self.show_notification("Failed to start recording")
                 
         except Exception as e:
@@ -930,14 +4324,27 @@ class SelectionWindow(Gtk.Window):
     def stop_recording(self):
         """Stop screen recording"""
         if self.is_recording:
-            if self.screencast_session.stop_recording():
-                self.show_notification("Recording saved")
-            else:
+            # The file is finalised in the background; the overlay can go now
+            if not self.screencast_session.stop_recording(self.on_recording_stopped):
                 self.show_notification("Error stopping recording")
         
         self.is_recording = False
         self.manager.end_capture_session()
     
+    def on_recording_dropping_frames(self, stats):
+        """Warn once when the encoder keeps falling behind"""
+        self.show_notification(
+            f"Recording is dropping frames with {stats.encoder_key}; "
+            "try a faster encoder or a smaller area")
+        self.selection_overlay.queue_draw()
+    
+    def on_recording_stopped(self, success):
+        """Handle the end of recording finalisation"""
+        if success:
+            self.show_notification("Recording saved")
+        else:
+            self.show_notification("Error stopping recording")
+    
     def close_window(self):
         """Close selection window and show settings again"""
         self.manager.end_capture_session()
@@ -948,11 +4355,382 @@ class SimpleShotApp(Adw.Application):
     
     def __init__(self):
         super().__init__(application_id='net.bloupla.simpleshot',
-                        flags=Gio.ApplicationFlags.FLAGS_NONE)
+                        flags=Gio.ApplicationFlags.HANDLES_COMMAND_LINE)
         self.config = SimpleShotConfig()
+        self.timing_log = TimingLog(self.config)
+        self.history = CaptureHistory(self.config)
+        self.duplicates = DuplicateIndex(self.config)
+        self.thumbnails = ThumbnailCache(Path(GLib.get_user_cache_dir()) / 'simpleshot' / 'thumbnails')
+        self.exit_status = 0
         self.selection_windows = []
         self.settings_window = None
         self.screencast_session = None
+        self.session_manager = ScreenCastSessionManager(self, self.config)
+        self.save_queue = ScreenshotSaveQueue(self)
+        self.capture_sequence = None
+        self.replay_session = None
+        
+        stop_action = Gio.SimpleAction.new("stop-sequence", None)
+        stop_action.connect("activate", lambda action, param: self.stop_capture_sequence())
+        self.add_action(stop_action)
+        
+        # Scripted captures, exported over D-Bus as org.gtk.Actions on the
+        # application object: screenshot((x, y, w, h, output)) and
+        # record((x, y, w, h, output, duration)). A width of 0 captures the
+        # whole first stream; an empty output uses the configured folders.
+        screenshot_action = Gio.SimpleAction.new("screenshot", GLib.VariantType.new("(iiiis)"))
+        screenshot_action.connect("activate", self.on_screenshot_action)
+        self.add_action(screenshot_action)
+        
+        record_action = Gio.SimpleAction.new("record", GLib.VariantType.new("(iiiisd)"))
+        record_action.connect("activate", self.on_record_action)
+        self.add_action(record_action)
+        
+        # Instant replay: start-replay, save-replay and stop-replay
+        for name, handler in (("start-replay", self.start_replay),
+                              ("save-replay", self.save_replay),
+                              ("stop-replay", self.stop_replay)):
+            replay_action = Gio.SimpleAction.new(name, None)
+            replay_action.connect("activate", lambda action, param, handler=handler: handler())
+            self.add_action(replay_action)
+        
+        self.add_main_option("screenshot", 0, GLib.OptionFlags.NONE, GLib.OptionArg.NONE,
+                             "Take a screenshot without the selection UI", None)
+        self.add_main_option("record", 0, GLib.OptionFlags.NONE, GLib.OptionArg.NONE,
+                             "Record without the selection UI", None)
+        self.add_main_option("region", 0, GLib.OptionFlags.NONE, GLib.OptionArg.STRING,
+                             "Desktop region to capture (default: whole screen)", "X,Y,WIDTH,HEIGHT")
+        self.add_main_option("output", 0, GLib.OptionFlags.NONE, GLib.OptionArg.STRING,
+                             "File to write (format from the extension)", "PATH")
+        self.add_main_option("duration", 0, GLib.OptionFlags.NONE, GLib.OptionArg.DOUBLE,
+                             "Recording length in seconds (default: 10)", "SECONDS")
+        self.add_main_option("replay", 0, GLib.OptionFlags.NONE, GLib.OptionArg.STRING,
+                             "Control the instant replay buffer", "start|save|stop")
+        self.add_main_option("stdout", 0, GLib.OptionFlags.NONE, GLib.OptionArg.NONE,
+                             "Write the screenshot to standard output as PNG", None)
+        self.add_main_option("timing-summary", 0, GLib.OptionFlags.NONE, GLib.OptionArg.NONE,
+                             "Print p50/p95 capture stage timings and exit", None)
+        self.add_main_option("quiet", ord('q'), GLib.OptionFlags.NONE, GLib.OptionArg.NONE,
+                             "Do not print the path of the saved file", None)
+    
+    def do_startup(self):
+        """Application startup"""
+        Adw.Application.do_startup(self)
+        # Join segments of crash-safe recordings that never finished
+        RecordingSegments.recover(self, self.config.video_dir)
+        # Run with --gapplication-service, keep the warm ScreenCast session
+        # around between scripted calls
+        if self.get_flags() & Gio.ApplicationFlags.IS_SERVICE:
+            self.set_inactivity_timeout(ScreenCastSessionManager.IDLE_TIMEOUT_SECONDS * 1000)
+    
+    def do_handle_local_options(self, options):
+        """Handle options that never need the running instance"""
+        if options.contains("timing-summary"):
+            print(self.timing_log.format_summary())
+            return 0
+        return -1
+    
+    def do_command_line(self, command_line):
+        """Handle the command line of this or a remote instance"""
+        options = command_line.get_options_dict().end().unpack()
+        
+        if 'replay' in options:
+            return self.handle_replay_command(command_line, options)
+        
+        if 'screenshot' not in options and 'record' not in options:
+            self.activate()
+            return 0
+        
+        try:
+            region = parse_region(options['region']) if 'region' in options else None
+        except ValueError as e:
+            command_line.printerr_literal(f"{e}\n")
+            return 1
+        
+        # Resolve relative paths against the caller's working directory
+        output = ''
+        if options.get('output'):
+            output = command_line.create_file_for_arg(options['output']).get_path()
+        
+        # The caller waits until we drop command_line, so keep it (and the
+        # application) until the capture has finished
+        self.hold()
+        
+        quiet = 'quiet' in options
+        
+        def on_done(success, message):
+            if success:
+                if not quiet:
+                    command_line.print_literal(f"{message}\n")
+            else:
+                command_line.printerr_literal(f"{message}\n")
+                command_line.set_exit_status(1)
+                self.exit_status = 1
+            self.release()
+        
+        if 'record' in options:
+            self.record_region(region, output, options.get('duration', 10.0), on_done)
+        else:
+            self.capture_region(region, output, on_done)
+        return 0
+    
+    def handle_replay_command(self, command_line, options):
+        """Handle --replay start|save|stop"""
+        command = options['replay']
+        if command not in ('start', 'save', 'stop'):
+            command_line.printerr_literal(f"Unknown replay command: {command}\n")
+            return 1
+        
+        if command == 'stop':
+            self.stop_replay()
+            return 0
+        
+        output = ''
+        if options.get('output'):
+            output = command_line.create_file_for_arg(options['output']).get_path()
+        quiet = 'quiet' in options
+        self.hold()
+        
+        def on_done(success, message):
+            if success:
+                if not quiet:
+                    command_line.print_literal(f"{message}\n")
+            else:
+                command_line.printerr_literal(f"{message}\n")
+                command_line.set_exit_status(1)
+                self.exit_status = 1
+            self.release()
+        
+        if command == 'start':
+            self.start_replay(on_done)
+        else:
+            self.save_replay(output, on_done)
+        return 0
+    
+    def is_replaying(self):
+        return self.replay_session is not None and self.replay_session.is_replaying()
+    
+    def start_replay(self, callback=None):
+        """Start the instant replay buffer; callback(success, message)"""
+        callback = callback or (lambda success, message: print(message))
+        if self.is_replaying():
+            callback(True, "Instant replay is already running")
+            return
+        self.session_manager.acquire(lambda session: self._start_replay_with(session, callback))
+    
+    def _start_replay_with(self, session, callback):
+        if not session:
+            callback(False, "Failed to initialize screen capture")
+            return
+        if not session.start_replay(session.get_stream_for_region(None)):
+            self.session_manager.release()
+            callback(False, "Failed to start instant replay")
+            return
+        
+        # Keep the session (and the application) until the buffer is stopped
+        self.replay_session = session
+        self.hold()
+        callback(True, f"Instant replay buffering the last {self.config.replay_seconds} s")
+    
+    def save_replay(self, output='', callback=None):
+        """Write the instant replay buffer to a file; callback(success, message)"""
+        callback = callback or (lambda success, message: print(message))
+        if not self.is_replaying():
+            callback(False, "Instant replay is not running")
+            return
+        
+        session = self.replay_session
+        try:
+            if output:
+                filepath = output
+            else:
+                Path(self.config.video_dir).mkdir(parents=True, exist_ok=True)
+                filename = f"replay_{capture_timestamp()}.{session.replay_backend.extension}"
+                filepath = reserve_capture_path(os.path.join(self.config.video_dir, filename))
+        except OSError as e:
+            callback(False, f"Error creating replay file: {e}")
+            return
+        
+        def on_saved(success):
+            notification = Gio.Notification.new("SimpleShot")
+            if success:
+                notification.set_body(f"Replay saved to {filepath}")
+                callback(True, filepath)
+            else:
+                if not output:
+                    # Don't leave the empty reserved file behind
+                    try:
+                        os.remove(filepath)
+                    except OSError:
+                        pass
+                notification.set_body("Error saving replay")
+                callback(False, f"Error saving replay: {filepath}")
+            self.send_notification(None, notification)
+        
+        session.save_replay(filepath, on_saved)
+    
+    def stop_replay(self):
+        """Stop the instant replay buffer and free its memory"""
+        if self.replay_session is None:
+            return
+        self.replay_session.stop_replay()
+        self.replay_session = None
+        self.session_manager.release()
+        self.release()
+    
+    def on_screenshot_action(self, action, parameter):
+        """Handle the exported screenshot action"""
+        x, y, width, height, output = parameter.unpack()
+        region = (x, y, width, height) if width > 0 and height > 0 else None
+        self.hold()
+        self.capture_region(region, output, lambda success, message: self._on_action_done(message))
+    
+    def on_record_action(self, action, parameter):
+        """Handle the exported record action"""
+        x, y, width, height, output, duration = parameter.unpack()
+        region = (x, y, width, height) if width > 0 and height > 0 else None
+        self.hold()
+        self.record_region(region, output, duration, lambda success, message: self._on_action_done(message))
+    
+    def _on_action_done(self, message):
+        print(message)
+        self.release()
+    
+    def capture_region(self, region, output, callback):
+        """Capture a desktop region without UI; callback(success, message)"""
+        timings = self.timing_log.begin('screenshot')
+        self.session_manager.acquire(
+            lambda session: self._capture_region_with(session, region, output, callback, timings))
+    
+    def _capture_region_with(self, session, region, output, callback, timings):
+        timings.mark('session')
+        if not session:
+            timings.finish(success=False, error="no session")
+            callback(False, "Failed to initialize screen capture")
+            return
+        
+        stream = session.get_stream_for_region(region)
+        if stream is None:
+            self.session_manager.release()
+            timings.finish(success=False, error="region outside screen")
+            callback(False, "Region is outside the captured screen")
+            return
+        session.capture_frame(
+            stream,
+            lambda frame: self._save_region(session, stream, frame, region, output, callback,
+                                            timings),
+            settle=False)
+    
+    def _save_region(self, session, stream, frame, region, output, callback, timings):
+        timings.mark('frame')
+        self.session_manager.release()
+        if frame is None:
+            timings.finish(success=False, error="no frame")
+            callback(False, "No frame available from ScreenCast stream")
+            return
+        
+        crop_rect = session.region_to_frame_rect(stream, region, frame.width, frame.height)
+        if crop_rect is None:
+            timings.finish(success=False, error="region outside screen")
+            callback(False, "Region is outside the captured screen")
+            return
+        if output:
+            image_format = get_image_format_for_path(output, self.config.image_format)
+            save_path = output
+        else:
+            image_format = get_image_format(self.config.image_format)
+            filename = f"screenshot_{capture_timestamp()}.{image_format.extension}"
+            save_path = os.path.join(self.config.picture_dir, filename)
+        
+        def on_saved(path, error):
+            if error:
+                callback(False, f"Error saving screenshot: {error}")
+            else:
+                callback(True, path)
+        
+        queued = self.save_queue.submit(
+            frame, crop_rect, save_path, image_format,
+            self.config.png_compression, self.config.image_quality,
+            fsync=self.config.fsync_screenshots, overwrite=bool(output),
+            saved_callback=on_saved,
+            timings=timings,
+            history={'monitor': stream.describe() if stream else None})
+        if not queued:
+            callback(False, "Screenshot save queue is full")
+    
+    def record_region(self, region, output, duration, callback):
+        """Record a desktop region for duration seconds; callback(success, message)"""
+        self.session_manager.acquire(
+            lambda session: self._record_region_with(session, region, output, duration, callback))
+    
+    def _record_region_with(self, session, region, output, duration, callback):
+        if not session:
+            callback(False, "Failed to initialize screen capture")
+            return
+        
+        # The crop needs the stream size, which the first frame tells us
+        stream = session.get_stream_for_region(region)
+        if stream is None:
+            self.session_manager.release()
+            callback(False, "Region is outside the captured screen")
+            return
+        session.capture_frame(
+            stream,
+            lambda frame: self._start_region_recording(
+                session, stream, frame, region, output, duration, callback),
+            settle=False)
+    
+    def _start_region_recording(self, session, stream, frame, region, output, duration, callback):
+        if frame is None:
+            self.session_manager.release()
+            callback(False, "No frame available from ScreenCast stream")
+            return
+        
+        crop_rect = None
+        if region:
+            crop_rect = session.region_to_frame_rect(stream, region, frame.width, frame.height)
+            if crop_rect is None:
+                self.session_manager.release()
+                callback(False, "Region is outside the captured screen")
+                return
+        
+        try:
+            if output:
+                filepath = output
+            else:
+                Path(self.config.video_dir).mkdir(parents=True, exist_ok=True)
+                backend = get_encoder_backend(self.config.encoder)
+                filename = f"recording_{capture_timestamp()}.{backend.extension}"
+                filepath = reserve_capture_path(os.path.join(self.config.video_dir, filename))
+        except OSError as e:
+            self.session_manager.release()
+            callback(False, f"Error creating recording file: {e}")
+            return
+        
+        if not session.start_recording(stream, filepath, crop_rect):
+            self.session_manager.release()
+            if not output:
+                try:
+                    os.remove(filepath)
+                except OSError:
+                    pass
+            callback(False, "Failed to start recording")
+            return
+        session.recording_stats.drops_callback = lambda stats: print(
+            f"Warning: recording is dropping frames with {stats.encoder_key}")
+        
+        def on_stopped(success):
+            self.session_manager.release()
+            if success:
+                callback(True, filepath)
+            else:
+                callback(False, f"Recording did not finish cleanly: {filepath}")
+        
+        def stop():
+            session.stop_recording(on_stopped)
+            return False
+        
+        GLib.timeout_add(int(duration * 1000), stop)
     
     def do_activate(self):
         """Application activation"""
@@ -964,15 +4742,13 @@ class SimpleShotApp(Adw.Application):
         """Create ScreenCast session and selection windows on all monitors"""
         self.settings_window = settings_win
         
-        # Create ScreenCast session
-        self.screencast_session = ScreenCastSession(self, self.config)
-        
-        # Start the session, then show selection UI
-        self.screencast_session.start_session(self._on_screencast_ready)
+        # Reuse the running ScreenCast session if there is one, then show
+        # the selection UI
+        self.session_manager.acquire(self._on_screencast_ready)
     
-    def _on_screencast_ready(self, success):
+    def _on_screencast_ready(self, session):
         """Called when ScreenCast session is ready"""
-        if not success:
+        if not session:
             print("Failed to create ScreenCast session")
             if self.settings_window:
                 self.settings_window.present()
@@ -983,42 +4759,161 @@ class SimpleShotApp(Adw.Application):
             return
         
         print("ScreenCast session ready, showing selection UI")
+        self.screencast_session = session
+        
+        if self.config.precapture:
+            # Freeze every stream before any overlay is up
+            frozen_frames = {}
+            
+            def on_frame(stream, frame):
+                frozen_frames[stream.node_id] = frame
+                if len(frozen_frames) == len(session.streams):
+                    self._show_selection_windows(frozen_frames)
+            
+            # Settle, so the settings window that was just hidden is not
+            # frozen into the frame
+            for stream in session.streams:
+                session.capture_frame(
+                    stream, lambda frame, stream=stream: on_frame(stream, frame), settle=True)
+        else:
+            self._show_selection_windows({})
+    
+    def _show_selection_windows(self, frozen_frames):
+        """Create selection windows on all monitors
         
-        # Create selection windows on all monitors
+        frozen_frames maps stream node IDs to pre-captured frames.
+        """
+        if not self.screencast_session:
+            return
+        
+        # Create selection windows on every monitor that was shared
         display = Gdk.Display.get_default()
         monitors = display.get_monitors()
+        unshared = []
         
         for i in range(monitors.get_n_items()):
             monitor = monitors.get_item(i)
-            win = SelectionWindow(self, self.config, self, monitor, self.screencast_session)
+            stream = self.screencast_session.get_stream_for_monitor(monitor)
+            if stream is None:
+                # Nothing to crop from: a selection here would capture the
+                # wrong screen
+                unshared.append(monitor.get_connector() or f"monitor {i + 1}")
+                continue
+            frozen_frame = frozen_frames.get(stream.node_id)
+            win = SelectionWindow(self, self.config, self, monitor, self.screencast_session,
+                                  frozen_frame)
             win.fullscreen_on_monitor(monitor)
             win.present()
             self.selection_windows.append(win)
+        
+        if unshared:
+            notification = Gio.Notification.new("SimpleShot")
+            notification.set_body(
+                f"Not shared with SimpleShot: {', '.join(unshared)}. "
+                "Select all monitors in the screen sharing dialog to capture them.")
+            self.send_notification(None, notification)
+        if not self.selection_windows:
+            self.end_capture_session()
 
     def hide_all_selection_windows(self):
         """Hide all selection windows"""
         for win in self.selection_windows:
             win.set_visible(False)
 
+    def start_capture_sequence(self, sequence):
+        """Run a burst or interval capture; the session stays up until it ends"""
+        self.capture_sequence = sequence
+        sequence.finished_callback = self._on_capture_sequence_finished
+        
+        if sequence.count is None:
+            # The overlay is hidden, so offer a way to stop from the
+            # notification
+            notification = Gio.Notification.new("SimpleShot")
+            notification.set_body(f"Capturing every {self.config.interval_seconds} s")
+            notification.add_button("Stop", "app.stop-sequence")
+            self.send_notification("capture-sequence", notification)
+        
+        sequence.start()
+    
+    def stop_capture_sequence(self):
+        """Stop the running interval or burst capture"""
+        if self.capture_sequence:
+            self.capture_sequence.stop()
+    
+    def _on_capture_sequence_finished(self, sequence):
+        """Report a finished sequence and close the capture UI"""
+        self.withdraw_notification("capture-sequence")
+        
+        message = f"Saved {sequence.saved} screenshots"
+        if sequence.failed:
+            message += f" ({sequence.failed} failed)"
+        notification = Gio.Notification.new("SimpleShot")
+        notification.set_body(message)
+        self.send_notification(None, notification)
+        
+        if sequence is self.capture_sequence:
+            self.capture_sequence = None
+            self.end_capture_session()
+    
+    def drop_frozen_frame(self):
+        """Switch all selection windows back to the live screen"""
+        for win in self.selection_windows:
+            win.frozen_frame = None
+            win.background.set_visible(False)
+
     def end_capture_session(self):
         """Close all selection windows and show the main window"""
         for win in self.selection_windows:
             win.close()
         self.selection_windows = []
         
-        # Close ScreenCast session
+        # Keep the ScreenCast session warm for the next capture
         if self.screencast_session:
-            self.screencast_session.close_session()
+            self.session_manager.release()
             self.screencast_session = None
         
         if self.settings_window:
             self.settings_window.present()
 
 
+    def do_shutdown(self):
+        """Close the ScreenCast session on exit"""
+        self.session_manager.close()
+        Adw.Application.do_shutdown(self)
+
+
 def main():
     """Main entry point"""
+    argv = list(sys.argv)
+    
+    # --stdout is handled here, in the calling process: the capture may run
+    # in an already running instance, which cannot write to our stdout. It
+    # writes a PNG to a file we then copy out.
+    stdout_path = None
+    if '--stdout' in argv:
+        if '--screenshot' not in argv:
+            print("--stdout can only be used with --screenshot", file=sys.stderr)
+            return 1
+        argv.remove('--stdout')
+        cache_dir = Path(GLib.get_user_cache_dir()) / 'simpleshot'
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        stdout_path = str(cache_dir / f"stdout-{os.getpid()}.png")
+        argv += ['--output', stdout_path, '--quiet']
+    
     app = SimpleShotApp()
-    return app.run(sys.argv)
+    status = app.run(argv) or app.exit_status
+    
+    if stdout_path:
+        try:
+            with open(stdout_path, 'rb') as f:
+                sys.stdout.buffer.write(f.read())
+            sys.stdout.buffer.flush()
+            os.remove(stdout_path)
+        except OSError as e:
+            print(f"Error writing screenshot to stdout: {e}", file=sys.stderr)
+            status = status or 1
+    
+    return status
 
 
 if __name__ == '__main__':